@@ -1,17 +1,28 @@
 import os
-import subprocess
 import math
 import time
 import csv
+import threading
 import matplotlib.pyplot as plt
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from hamming import *
 from utils import *
+from corpus import next_iteration
+from tuner import decode_with_settings, load_decoder_config, tune_all
+from sweep import Device, adaptive_sweep, load_inventory, run_sweep, sweep_matrix
+from progressive import IncrementalDecoder, ProgressiveImage, to_bit_vector
+from compression import compress, decompress, image_to_bits, write_payload_file
+from multilevel import bits_per_symbol, decode_multilevel, default_preamble, encode_symbols, symbols_to_payload
+from matched_filter import benchmark_all
+from streaming import Frame, StreamDecoder, build_stream, decode_stream, stream_summary, write_stream_file
 import easygui
 
 global iter
 global total
 
+# Sweeps on several devices write the metrics CSVs from multiple threads
+metrics_lock = threading.Lock()
+
 def decode_temp_msg(temps: List[float], temps_per_bit: int, tolerance:float) -> str:
     """
     Decode a message from temperature readings.
@@ -116,7 +127,7 @@ def plot_temperature_over_time(temperatures: List[float], interval: int, text: s
     plt.grid(True)
     plt.show()
 
-def run_rpi4(milis:int, hamming:bool, sampling:int, msg_size:int) -> str:
+def run_rpi4(milis:int, hamming:bool, sampling:int, msg_size:int, device:Optional[Device] = None) -> str:
     """
     Runs a the command that runs the channel on the Raspberry Pi 4 and returns the output.
 
@@ -125,21 +136,18 @@ def run_rpi4(milis:int, hamming:bool, sampling:int, msg_size:int) -> str:
     hamming (bool): Whether to use Hamming encoding.
     sampling (int): The sampling rate in milliseconds.
     msg_size (int): The size of the message in bytes.
+    device (Optional[Device], optional): The board to run on. Defaults to None (the board at the default address).
 
     Returns:
     str: The output of the command.
     """
-    # Define the shell command
-    measurements = int((milis/(sampling/1000)) * msg_size)
-    command = "./analysis_tool/shell_scripts/run_on_pi " + str(milis) + " " + str(int(hamming)) + " " + str(measurements) + " " + str(sampling)
-    print(command)
-
-    # Run the command
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    if device is None:
+        device = Device('rpi4')
 
-    return result.stdout
+    measurements = int((milis/(sampling/1000)) * msg_size)
+    return device.run(milis, hamming, sampling, measurements)
 
-def analyze_single_test(interval: int, hamming: bool, hamming_block_size: int, sample_rate:int, path:str ,image:bool = False, plot:bool = True) -> List:
+def analyze_single_test(interval: int, hamming: bool, hamming_block_size: int, sample_rate:int, path:str ,image:bool = False, plot:bool = True, settings:Optional[Dict] = None, previous:Optional[List[str]] = None, compressed:bool = False) -> List:
     """
     Analyzes a single test run for decoding a temperature-based binary message.
 
@@ -151,12 +159,15 @@ def analyze_single_test(interval: int, hamming: bool, hamming_block_size: int, s
     path (str): The file path to the temperature data file.
     image (bool, optional): Whether to decode the message as an image. Defaults to False.
     plot (bool, optional): Whether to plot the temperature data over time. Defaults to True.
+    settings (Optional[Dict], optional): Tuned decoder settings (see tuner.py). Defaults to None (nominal settings).
+    previous (Optional[List[str]], optional): Decoded images of previous runs fused with this one in image mode. Defaults to None.
+    compressed (bool, optional): Whether the image was sent as a compressed payload (see compression.py). Defaults to False.
 
     Returns:
     List: A list containing metrics of the decoding process including accuracy, bit rate, total errors, error rate, corrected errors, correction rate, meaningful errors, throughput, total transfer time, raw message, decoded message, and readable message.
     """
-    hamming_truth = "011001101100001111100111110110111000000101000010"
-    truth = "01101000011011110110110001100001"
+    hamming_truth = HAMMING_TRUTH
+    truth = TRUTH
     msg = ''
     plot_truth = hamming_truth
 
@@ -176,13 +187,46 @@ def analyze_single_test(interval: int, hamming: bool, hamming_block_size: int, s
         temperatures = [float(line.strip()) for line in file]
 
     # Decode temps
-    temps_per_bit = interval // sample_rate
-    raw_msg = decode_temp_msg(temperatures, temps_per_bit,interval/10000)
+    if settings:
+        temps_per_bit = round(settings['temps_per_bit'])
+        raw_msg = decode_with_settings(temperatures, settings['offset'], settings['temps_per_bit'], settings['tolerance'])
+    else:
+        temps_per_bit = interval // sample_rate
+        raw_msg = decode_temp_msg(temperatures, temps_per_bit,interval/10000)
 
     if (image):
-        stringed = ''.join(map(str,raw_msg))
+        pixels = 32 * 32
+        on_air_bits = len(raw_msg)
+        if compressed:
+            payload = to_bit_vector(raw_msg)
+            if hamming:
+                # host.c Hamming encodes the compressed payload
+                blocks = len(raw_msg) // hamming_block_size
+                data, _, _ = decode_blocks(payload[:blocks * hamming_block_size].reshape(-1, hamming_block_size))
+                payload = data.ravel()
+            decoded = decompress(payload, pixels, 32)
+            on_air_bits = decoded.consumed_bits
+            if hamming:
+                data_bits = hamming_block_size - int(math.log2(hamming_block_size)) - 1
+                on_air_bits = math.ceil(decoded.consumed_bits / data_bits) * hamming_block_size
+            progressive = ProgressiveImage(32, 32, 0, previous, fuse=bool(previous))
+            progressive.update(decoded.pixels)
+        else:
+            progressive = ProgressiveImage(32, 32, hamming_block_size if hamming else 0, previous, fuse=bool(previous))
+            progressive.update(raw_msg)
+            on_air_bits = min(on_air_bits, len(progressive.raw))
+
+        total_transfer_time = on_air_bits * (interval / 1000)
+        print("---------METRICS---------")
+        print(f"Bits on air: {on_air_bits}")
+        print(f"Transfer time: {total_transfer_time:.4f} s")
+        print(f"Pixel throughput: {pixels / total_transfer_time:.4f} pixel/s")
+        if compressed:
+            print(f"Compression ratio: {decoded.compression_ratio:.4f}")
+            print(f"Faulty segments: {decoded.faulty_segments}")
+
         output_path = 'dino_100.png'  # Specify the output path
-        image = binary_string_to_image(stringed,32,32,output_path)
+        image = progressive.save(output_path)
         image.show()  # This will display the image
         return     
 
@@ -260,7 +304,304 @@ def analyze_single_test(interval: int, hamming: bool, hamming_block_size: int, s
 
     return accuracy, bit_rate, total_errors, error_rate, corrected_errors, correction_rate, meaningful_errors, throughput, total_transfer_time, raw_msg, msg, readable
 
-def run_single_test(interval: int, hamming: bool, hamming_block_size: int, sample_rate:int, image:bool = False, plot:bool = True) -> None:
+def analyze_multilevel_test(interval: int, levels: int, sample_rate:int, path:str, plot:bool = True) -> List:
+    """
+    Analyzes a multi-level test run, where each interval carries a symbol of several bits.
+
+    Args:
+    interval (int): The interval in milliseconds of each symbol.
+    levels (int): The number of symbol levels.
+    sample_rate (int): The sample rate in Hz for temperature measurements.
+    path (str): The file path to the temperature data file.
+    plot (bool, optional): Whether to plot the temperature data over time. Defaults to True.
+
+    Returns:
+    List: A list containing the accuracy, bit rate, meaningful errors, symbol errors, throughput, total transfer time and decoded message.
+    """
+    truth = TRUTH
+    with open(path, "r") as file:
+        temperatures = [float(line.strip()) for line in file if isfloat(line.strip())]
+
+    temps_per_bit = interval // sample_rate
+    msg, symbols, calibration = decode_multilevel(temperatures, temps_per_bit, levels)
+    sent = encode_symbols(truth, levels)[len(default_preamble(levels)):]
+
+    # Metrics over the message, the preamble only trains the decoder
+    total_transfer_time = len(symbols) * (interval / 1000)
+    bit_rate = len(msg) / total_transfer_time
+    symbol_errors = int((symbols[:len(sent)] != sent[:len(symbols)]).sum())
+    meaningful_errors = len(compare_strings(msg[:len(truth)], truth))
+    accuracy = (len(msg[:len(truth)]) - meaningful_errors)/len(truth) * 100
+    throughput = (len(msg[:len(truth)]) - meaningful_errors)/total_transfer_time
+
+    print("---------MESSAGES---------")
+    print("Truth:")
+    print_with_pipe(truth,8)
+    print("Extracted message:")
+    print_with_pipe(msg,8)
+    print("Final message:")
+    print(replace_non_alnum_with_asterisk(binary_to_string(msg[:len(truth)])))
+
+    print("---------METRICS---------")
+    print(f"Bits per symbol: {bits_per_symbol(levels)}")
+    print(f"Level thresholds: {calibration.thresholds}")
+    print(f"Bit Rate: {bit_rate:.4f} bit/s")
+    print(f"Symbol Errors: {symbol_errors}")
+    print(f"Meaningful Errors: {meaningful_errors}")
+    print(f"Throughput: {throughput:.4f} bit/s")
+    print(f"Transfer time: {total_transfer_time:.4f} s")
+    print(f"Accuracy: {accuracy:.4f}%")
+
+    if (plot):
+        plot_temperature_over_time(temperatures,temps_per_bit,msg)
+
+    return accuracy, bit_rate, meaningful_errors, symbol_errors, throughput, total_transfer_time, msg
+
+def save_capture(raw_temps: List[str], directory: str, stem: str) -> str:
+    """
+    Saves the temperatures of a long capture under the first free name, so captures accumulate instead of overwriting each other.
+
+    Args:
+    raw_temps (List[str]): The logged temperatures.
+    directory (str): The directory to save the capture to.
+    stem (str): The start of the file name, followed by _<index>.txt.
+
+    Returns:
+    str: The path of the saved capture.
+    """
+    os.makedirs(directory, exist_ok=True)
+    index = 0
+    while os.path.exists(os.path.join(directory, f'{stem}_{index}.txt')):
+        index += 1
+
+    path = os.path.join(directory, f'{stem}_{index}.txt')
+    with open(path, 'w') as file:
+        file.write('\n'.join(raw_temps) + '\n')
+    print(f"Capture saved as {path}")
+    return path
+
+def print_frame(frame: Frame) -> None:
+    """
+    Prints a frame found in a stream.
+
+    Args:
+    frame (Frame): The frame.
+
+    Returns:
+    None
+    """
+    status = "OK" if frame.valid else "CORRUPTED"
+    print(f"Frame {frame.seq:3d} at bit {frame.start:6d} [{status}]: {replace_non_alnum_with_asterisk(binary_to_string(frame.payload))}")
+
+def print_stream_metrics(frames: List[Frame], elapsed: float, bits: int) -> Dict:
+    """
+    Prints the frame counts and sustained goodput of a stream.
+
+    Args:
+    frames (List[Frame]): The frames found in the stream.
+    elapsed (float): The duration of the stream in seconds.
+    bits (int): The number of bits received.
+
+    Returns:
+    Dict: The stream summary (see stream_summary).
+    """
+    summary = stream_summary(frames, elapsed, bits)
+    print("---------METRICS---------")
+    print(f"Valid frames: {summary['valid_frames']}")
+    print(f"Corrupted frames: {summary['corrupted_frames']}")
+    print(f"Missing frames: {summary['missing_frames']}")
+    print(f"Bit Rate: {summary['bit_rate']:.4f} bit/s")
+    print(f"Goodput: {summary['goodput']:.4f} bit/s")
+    print(f"Transfer time: {elapsed:.4f} s")
+    return summary
+
+def analyze_stream_test(interval: int, sample_rate:int, path:str, plot:bool = True, settings:Optional[Dict] = None) -> Dict:
+    """
+    Analyzes a recorded stream of frames, extracting every frame and flagging the corrupted ones.
+
+    Args:
+    interval (int): The interval in milliseconds of each bit.
+    sample_rate (int): The sample rate in Hz for temperature measurements.
+    path (str): The file path to the temperature data file.
+    plot (bool, optional): Whether to plot the temperature data over time. Defaults to True.
+    settings (Optional[Dict], optional): Tuned decoder settings (see tuner.py). Defaults to None (nominal settings).
+
+    Returns:
+    Dict: The stream summary (see stream_summary).
+    """
+    with open(path, "r") as file:
+        temperatures = [float(line.strip()) for line in file if isfloat(line.strip())]
+
+    temps_per_bit = interval // sample_rate
+    if settings:
+        frames, bits = decode_stream(temperatures, settings['temps_per_bit'], settings['tolerance'], settings['offset'])
+    else:
+        frames, bits = decode_stream(temperatures, temps_per_bit, interval/10000)
+
+    print("---------FRAMES---------")
+    for frame in frames:
+        print_frame(frame)
+
+    summary = print_stream_metrics(frames, len(temperatures) * (sample_rate / 1000), len(bits))
+
+    if (plot):
+        plot_temperature_over_time(temperatures,temps_per_bit,''.join(map(str, bits)))
+
+    return summary
+
+def run_stream_test(interval: int, sample_rate:int, stream_bits:int, device:Optional[Device] = None) -> Dict:
+    """
+    Runs a stream of frames on the RPI4, printing every frame as soon as it is received.
+
+    Args:
+    interval (int): The interval in milliseconds of each bit.
+    sample_rate (int): The sample rate in Hz for temperature measurements.
+    stream_bits (int): The number of bits of the stream, to know how long to log.
+    device (Optional[Device], optional): The board to run on. Defaults to None (the board at the default address).
+
+    Returns:
+    Dict: The stream summary (see stream_summary).
+    """
+    if device is None:
+        device = Device('rpi4')
+
+    decoder = StreamDecoder(interval // sample_rate, interval/10000)
+    measurements = int((interval/sample_rate) * stream_bits)
+
+    print("---------FRAMES---------")
+    raw_temps = []
+    for line in device.stream(interval, False, sample_rate*1000, measurements):
+        if not isfloat(line.strip()):
+            continue
+        raw_temps.append(line.strip())
+        for frame in decoder.feed([float(line)]):
+            print_frame(frame)
+
+    # Save for later use
+    save_capture(raw_temps, 'results/runs/stream', f'{interval}')
+
+    return print_stream_metrics(decoder.frames, len(raw_temps) * (sample_rate / 1000), decoder.received)
+
+def decode_previous_images(paths: List[str], interval: int, sample_rate: int, hamming: bool = False, hamming_block_size: int = 16) -> List[str]:
+    """
+    Decodes the saved runs of previous image transfers so they can be fused with a new one.
+
+    Args:
+    paths (List[str]): The saved runs.
+    interval (int): The interval in milliseconds used by the runs.
+    sample_rate (int): The sample rate in milliseconds used by the runs.
+    hamming (bool, optional): Whether the runs were Hamming encoded. Defaults to False.
+    hamming_block_size (int, optional): The block size for Hamming code. Defaults to 16.
+
+    Returns:
+    List[str]: The decoded pixels of each run.
+    """
+    previous = []
+    for path in paths:
+        with open(path, "r") as file:
+            temperatures = [float(line.strip()) for line in file if isfloat(line.strip())]
+        msg = decode_temp_msg(temperatures, interval // sample_rate, interval/10000)
+        if hamming:
+            # Correct the codewords and keep their data bits, the pixels
+            bits = to_bit_vector(msg)
+            blocks = bits[:len(bits) - len(bits) % hamming_block_size].reshape(-1, hamming_block_size)
+            data, _, _ = decode_blocks(blocks)
+            msg = ''.join(map(str, data.ravel()))
+        previous.append(msg)
+    return previous
+
+def run_image_test(interval: int, hamming: bool, hamming_block_size: int, sample_rate:int, previous:Optional[List[str]] = None, device:Optional[Device] = None, payload_bits:Optional[int] = None) -> None:
+    """
+    Runs an image transfer on the RPI4, showing the image as it is reconstructed.
+
+    Pixels not received yet are shown in gray (or in dark/light gray with the preview of previous runs).
+    A compressed payload only decodes once it is complete, so it is decompressed at the end of the capture.
+
+    Args:
+    interval (int): The interval in milliseconds between temperature samples.
+    hamming (bool): Whether to use Hamming code for error correction.
+    hamming_block_size (int): The block size for Hamming code.
+    sample_rate (int): The sample rate in Hz for temperature measurements.
+    previous (Optional[List[str]], optional): Decoded images of previous runs to preview and fuse with. Defaults to None.
+    device (Optional[Device], optional): The board to run on. Defaults to None (the board at the default address).
+    payload_bits (Optional[int], optional): Length of the compressed payload sent (see compression.py). Defaults to None (raw pixels).
+
+    Returns:
+    None
+    """
+    if device is None:
+        device = Device('rpi4')
+
+    progressive = ProgressiveImage(32, 32, hamming_block_size if hamming else 0, previous, fuse=bool(previous))
+    decoder = IncrementalDecoder(interval // sample_rate, interval/10000)
+    bits = len(progressive.raw)
+    if payload_bits is not None:
+        bits = payload_bits
+        if hamming:
+            # host.c Hamming encodes the compressed payload
+            data_bits = hamming_block_size - int(math.log2(hamming_block_size)) - 1
+            bits = math.ceil(payload_bits / data_bits) * hamming_block_size
+    measurements = int((interval/sample_rate) * bits)
+
+    plt.ion()
+    figure, axes = plt.subplots()
+    shown = axes.imshow(progressive.buffer, cmap='gray', vmin=0, vmax=255)
+    axes.set_title(f'Received 0/{bits} bits')
+
+    raw_temps = []
+    for line in device.stream(interval, hamming, sample_rate*1000, measurements):
+        if not isfloat(line.strip()):
+            continue
+        raw_temps.append(line.strip())
+        new_bits = decoder.feed([float(line)])
+        if len(new_bits):
+            # Redraw once per received bit
+            if payload_bits is None:
+                progressive.update(new_bits)
+                shown.set_data(progressive.buffer)
+            axes.set_title(f'Received {min(decoder.windows, bits)}/{bits} bits')
+            plt.pause(0.001)
+
+    plt.ioff()
+    if payload_bits is not None:
+        plt.close(figure)
+        path = save_capture(raw_temps, 'results/runs/dino', f'{interval}_compressed_hamming' if hamming else f'{interval}_compressed')
+        analyze_single_test(interval, hamming, hamming_block_size, sample_rate, path, image=True, plot=False, compressed=True)
+        return
+
+    if hamming:
+        print(f"Corrected blocks: {progressive.corrected_blocks}")
+        print(f"Blocks with multiple errors: {progressive.faulty_blocks}")
+
+    # Save for later use, next to the previous runs it can be fused with
+    save_capture(raw_temps, 'results/runs/dino', f'{interval}_hamming' if hamming else f'{interval}')
+
+    progressive.save(f'dino_{interval}.png')
+    plt.show()
+
+def add_device_column(csv_file: str) -> None:
+    """
+    Adds the Device column to a metrics file written before multi-device sweeps, filling its rows with N/A.
+
+    Args:
+    csv_file (str): The metrics file.
+
+    Returns:
+    None
+    """
+    with open(csv_file, 'r', newline='') as file:
+        rows = list(csv.reader(file, escapechar='\\'))
+    if not rows or 'Device' in rows[0]:
+        return
+
+    rows[0].append('Device')
+    for row in rows[1:]:
+        row.append('N/A')
+    with open(csv_file, 'w', newline='') as file:
+        writer = csv.writer(file, quotechar='"', quoting=csv.QUOTE_MINIMAL,  escapechar='\\')
+        writer.writerows(rows)
+
+def run_single_test(interval: int, hamming: bool, hamming_block_size: int, sample_rate:int, image:bool = False, plot:bool = True, iteration:Optional[int] = None, device:Optional[Device] = None, results_dir:Optional[str] = None) -> float:
     """
     Runs a single test for collecting and analyzing temperature-based binary messages from the RPI4.
 
@@ -271,23 +612,30 @@ def run_single_test(interval: int, hamming: bool, hamming_block_size: int, sampl
     sample_rate (int): The sample rate in Hz for temperature measurements.
     image (bool, optional): Whether to decode the message as an image. Defaults to False.
     plot (bool, optional): Whether to plot the temperature data over time. Defaults to True.
+    iteration (Optional[int], optional): The sweep iteration used to name the saved run. Defaults to None (the global iter).
+    device (Optional[Device], optional): The board to run on, its tag marks the saved run and metrics. Defaults to None (untagged default board).
+    results_dir (Optional[str], optional): The directory the run and metrics are saved to. Defaults to None (the results directory of the device, 'results' without one).
 
     Returns:
-    None
+    float: The accuracy of the test.
     """
-    hamming_truth = "011001101100001111100111110110111000000101000010"
-    truth = "01101000011011110110110001100001"
+    hamming_truth = HAMMING_TRUTH
+    truth = TRUTH
     global iter
+    if iteration is None:
+        iteration = iter
+    if results_dir is None:
+        results_dir = device.results_dir if device else 'results'
 
     if image:
-        raw_temps = run_rpi4(interval, hamming, sample_rate*1000, 1024)
+        raw_temps = run_rpi4(interval, hamming, sample_rate*1000, 1024, device)
     elif hamming:
-        raw_temps = run_rpi4(interval, hamming, sample_rate*1000, len(hamming_truth))
+        raw_temps = run_rpi4(interval, hamming, sample_rate*1000, len(hamming_truth), device)
     else:
-        raw_temps = run_rpi4(interval, hamming, sample_rate*1000, len(truth))
+        raw_temps = run_rpi4(interval, hamming, sample_rate*1000, len(truth), device)
 
     # Save temporally
-    temp_path = f'results/runs/.temp.txt'
+    temp_path = os.path.join(results_dir, 'runs', f'.temp_{device.device_id}.txt' if device else '.temp.txt')
     os.makedirs(os.path.dirname(temp_path), exist_ok=True)
     with open(temp_path, 'w') as temp_file:
         temp_file.write(raw_temps)
@@ -295,8 +643,10 @@ def run_single_test(interval: int, hamming: bool, hamming_block_size: int, sampl
     accuracy, bit_rate, total_errors, error_rate, corrected_errors, correction_rate, meaningful_errors, throughput, total_transfer_time, raw_msg, msg, readable = analyze_single_test(interval,hamming,hamming_block_size,sample_rate,temp_path,image,plot)
 
     # Save for later use
-    directory = f'results/runs/{interval}'
-    filename = f'{iter}_{hamming}_{int(accuracy)}.txt'
+    directory = os.path.join(results_dir, 'runs', str(interval))
+    filename = f'{iteration}_{hamming}_{int(accuracy)}.txt'
+    if device:
+        filename = f'{iteration}_{hamming}_{int(accuracy)}_{device.tag}.txt'
     file_path = os.path.join(directory, filename)
     os.makedirs(directory, exist_ok=True)
     with open(file_path, 'w') as file:
@@ -307,18 +657,26 @@ def run_single_test(interval: int, hamming: bool, hamming_block_size: int, sampl
         os.remove(temp_path)
 
     # Save metrics to CSV
-    csv_file = f'results/metrics/metrics_{interval}.csv'
-    file_exists = os.path.isfile(csv_file)
-    
-    with open(csv_file, mode='a', newline='') as file:
-        writer = csv.writer(file, quotechar='"', quoting=csv.QUOTE_MINIMAL,  escapechar='\\')
-        if not file_exists:
-            # Write header if the file doesn't exist
-            writer.writerow(['Interval','Hamming','Sample rate','Bit Rate', 'Total Errors', 'Error Rate', 'Corrected Errors', 'Correction Rate', 'Meaningful Errors', 'Throughput', 'Transfer Time', 'Accuracy','Raw message','Message','String'])
-        # Write the metrics
-        writer.writerow([interval,hamming,sample_rate,bit_rate, total_errors, error_rate, corrected_errors if hamming else 'N/A', correction_rate if hamming else 'N/A', meaningful_errors, throughput, total_transfer_time, accuracy, raw_msg, msg, str(readable)])
-
-    return
+    csv_file = os.path.join(results_dir, 'metrics', f'metrics_{interval}.csv')
+    row = [interval,hamming,sample_rate,bit_rate, total_errors, error_rate, corrected_errors if hamming else 'N/A', correction_rate if hamming else 'N/A', meaningful_errors, throughput, total_transfer_time, accuracy, raw_msg, msg, str(readable)]
+
+    with metrics_lock:
+        os.makedirs(os.path.dirname(csv_file), exist_ok=True)
+        file_exists = os.path.isfile(csv_file)
+        if file_exists:
+            # Metrics files written before multi-device sweeps have no Device column
+            add_device_column(csv_file)
+
+        with open(csv_file, mode='a', newline='') as file:
+            writer = csv.writer(file, quotechar='"', quoting=csv.QUOTE_MINIMAL,  escapechar='\\')
+            if not file_exists:
+                # Write header if the file doesn't exist
+                writer.writerow(['Interval','Hamming','Sample rate','Bit Rate', 'Total Errors', 'Error Rate', 'Corrected Errors', 'Correction Rate', 'Meaningful Errors', 'Throughput', 'Transfer Time', 'Accuracy','Raw message','Message','String','Device'])
+            # Write the metrics
+            row.append(device.tag if device else 'N/A')
+            writer.writerow(row)
+
+    return accuracy
 
 def main():
     global iter
@@ -331,6 +689,23 @@ def main():
     def parse_boolean_input(user_input):
         return user_input in ['yes', 'y']
 
+    def select_previous_images(interval, sample_rate, hamming, hamming_block_size):
+        if not parse_boolean_input(get_user_input("Fuse with previous image runs? (yes/no)", "no")):
+            return None
+        paths = easygui.fileopenbox(title="Select the previous runs", filetypes=[["*.txt", "Text Files"]], multiple=True)
+        if not paths:
+            print("No previous runs selected.")
+            return None
+        return decode_previous_images(paths, interval, sample_rate, hamming, hamming_block_size)
+
+    def select_decoder_settings(interval):
+        if not parse_boolean_input(get_user_input("Use tuned decoder settings? (yes/no)", "no")):
+            return None
+        settings = load_decoder_config(interval)
+        if settings is None:
+            print(f"No tuned settings for {interval} ms, using the nominal ones.")
+        return settings
+
     def analyze_previous_test():
         interval = int(get_user_input("Enter interval (ms)", "3000"))
         hamming = parse_boolean_input(get_user_input("Use Hamming code? (yes/no)", "no"))
@@ -343,10 +718,25 @@ def main():
             print("No file selected. Exiting.")
             return
 
+        if parse_boolean_input(get_user_input("Analyze as a stream of frames? (yes/no)", "no")):
+            plot = parse_boolean_input(get_user_input("Plot data? (yes/no)", "yes"))
+            analyze_stream_test(interval, sample_rate, path, plot, select_decoder_settings(interval))
+            return
+
+        levels = int(get_user_input("Enter symbol levels (2 for binary)", "2"))
+        if levels > 2:
+            plot = parse_boolean_input(get_user_input("Plot data? (yes/no)", "yes"))
+            analyze_multilevel_test(interval, levels, sample_rate, path, plot)
+            return
+
         image = parse_boolean_input(get_user_input("Analyze as image? (yes/no)", "no"))
+        compressed = image and parse_boolean_input(get_user_input("Compressed payload? (yes/no)", "no"))
+        previous = select_previous_images(interval, sample_rate, hamming, hamming_block_size) if image and not compressed else None
         plot = parse_boolean_input(get_user_input("Plot data? (yes/no)", "yes"))
 
-        analyze_single_test(interval, hamming, hamming_block_size, sample_rate, path, image, plot)
+        settings = select_decoder_settings(interval)
+
+        analyze_single_test(interval, hamming, hamming_block_size, sample_rate, path, image, plot, settings, previous, compressed)
 
     def run_new_test():
         interval = int(get_user_input("Enter interval (ms)", "3000"))
@@ -354,6 +744,20 @@ def main():
         hamming_block_size = int(get_user_input("Enter Hamming block size", "16"))
         sample_rate = int(get_user_input("Enter sample rate (ms)", "10"))
         image = parse_boolean_input(get_user_input("Analyze as image? (yes/no)", "no"))
+        if image and parse_boolean_input(get_user_input("Compressed payload? (yes/no)", "no")):
+            # The payload file sent by the RPI4 tells how long to listen
+            path = easygui.fileopenbox(title="Select the payload file", filetypes=[["*.txt", "Text Files"]])
+            if not path:
+                print("No file selected. Exiting.")
+                return
+            with open(path, "r") as file:
+                payload_bits = sum(len(line.strip()) for line in file)
+
+            run_image_test(interval, hamming, hamming_block_size, sample_rate, payload_bits=payload_bits)
+            return
+        if image:
+            run_image_test(interval, hamming, hamming_block_size, sample_rate, select_previous_images(interval, sample_rate, hamming, hamming_block_size))
+            return
         plot = parse_boolean_input(get_user_input("Plot data? (yes/no)", "yes"))
 
         run_single_test(interval, hamming, hamming_block_size, sample_rate, image, plot)
@@ -364,32 +768,14 @@ def main():
         if confirmation in ['yes', 'y']:
             start_time = time.time()
 
-            for i in range(0, 20):
-                iter = i
-                hamming = False
-                interval = 5000
-                sample_rate = 10  # Wait 10ms --> 100Hz sampling
-
-                while interval >= 10:
-                    run_single_test(interval, hamming, 16, sample_rate, plot=False)
-                    if interval == 1000:
-                        interval -= 500
-                    elif interval <= 500:
-                        interval -= 100
-                    else:
-                        interval -= 1000
-
-                interval = 5000
-                hamming = False
-
-                while interval >= 10:
-                    run_single_test(interval, hamming, 16, sample_rate, plot=False)
-                    if interval == 1000:
-                        interval -= 500
-                    elif interval <= 500:
-                        interval -= 100
-                    else:
-                        interval -= 1000
+            sample_rate = 10  # Wait 10ms --> 100Hz sampling
+            devices = load_inventory()
+            print(f"Running on {len(devices)} device(s): {', '.join(device.device_id for device in devices)}")
+
+            def run_job(job, device):
+                return run_single_test(job.interval, job.hamming, 16, sample_rate, plot=False, iteration=job.iteration, device=device)
+
+            run_sweep(sweep_matrix(20), devices, run_job)
 
             end_time = time.time()
             elapsed_time = (end_time - start_time)
@@ -398,12 +784,95 @@ def main():
             print(f"Execution Time: {elapsed_time:.6f} seconds")
             print(f"Execution Time: {elapsed_time_hours:.6f} hours")
 
+    def run_stream():
+        interval = int(get_user_input("Enter interval (ms)", "3000"))
+        sample_rate = int(get_user_input("Enter sample rate (ms)", "10"))
+
+        # The stream file sent by the RPI4 tells how long to listen
+        path = easygui.fileopenbox(title="Select the stream file", filetypes=[["*.txt", "Text Files"]])
+        if not path:
+            print("No file selected. Exiting.")
+            return
+        with open(path, "r") as file:
+            stream_bits = sum(len(line.strip()) for line in file)
+
+        run_stream_test(interval, sample_rate, stream_bits)
+
+    def create_payload():
+        if parse_boolean_input(get_user_input("Create a stream of frames? (yes/no)", "no")):
+            payload_bits = int(get_user_input("Enter payload bits per frame", "64"))
+            repetitions = int(get_user_input("Enter message repetitions", "10"))
+            output_path = get_user_input("Enter stream file", "stream.txt")
+            write_stream_file(build_stream(TRUTH, payload_bits, repetitions), output_path)
+            print("Copy it to the RPI4 and run host with it in stream mode.")
+            return
+
+        levels = int(get_user_input("Enter symbol levels (2 for a compressed image)", "2"))
+        if levels > 2:
+            output_path = get_user_input("Enter payload file", "payload.txt")
+            symbols = encode_symbols(TRUTH, levels)
+            write_payload_file(symbols_to_payload(symbols), output_path)
+            print(f"{len(default_preamble(levels))} preamble and {len(symbols) - len(default_preamble(levels))} message symbols.")
+            print(f"Copy it to the RPI4 and run host with it and {levels} levels.")
+            return
+
+        image_path = easygui.fileopenbox(title="Select the image to send", filetypes=[["*.png", "PNG Files"]])
+        if not image_path:
+            print("No file selected. Exiting.")
+            return
+        output_path = get_user_input("Enter payload file", "payload.txt")
+
+        pixels = image_to_bits(image_path, 32, 32)
+        payload = compress(pixels, 32)
+        write_payload_file(payload, output_path)
+        print(f"Compression ratio: {len(pixels) / len(payload):.4f}")
+        print("Copy it to the RPI4 and pass it as the last argument of host to send it.")
+
+    def adaptive_interval_search():
+        hamming = parse_boolean_input(get_user_input("Use Hamming code? (yes/no)", "no"))
+        target_accuracy = float(get_user_input("Enter target accuracy (%)", "90"))
+        max_half_width = float(get_user_input("Enter confidence interval half width (%)", "5"))
+        sample_rate = 10  # Wait 10ms --> 100Hz sampling
+        devices = load_inventory()
+        print(f"Running on {len(devices)} device(s): {', '.join(device.device_id for device in devices)}")
+        start_time = time.time()
+
+        def run_job(job, device):
+            return run_single_test(job.interval, job.hamming, 16, sample_rate, plot=False, iteration=job.iteration, device=device)
+
+        # Continue the numbering of the saved runs so they are not overwritten
+        first_iteration = max(next_iteration(os.path.join(directory, 'runs')) for directory in {device.results_dir for device in devices})
+        try:
+            fastest, estimates = adaptive_sweep(devices, run_job, hamming, target_accuracy, max_half_width=max_half_width,
+                                                first_iteration=first_iteration)
+        except RuntimeError as error:
+            print(error)
+            return
+
+        print("---------ADAPTIVE SWEEP---------")
+        for interval in sorted(estimates):
+            estimate = estimates[interval]
+            if estimate.accuracies:
+                print(f"{interval} ms: {estimate.mean:.2f}% ± {estimate.half_width:.2f} ({len(estimate.accuracies)} runs)")
+        runs = sum(len(estimate.accuracies) for estimate in estimates.values())
+        if fastest is None:
+            print(f"No interval reaches {target_accuracy:.2f}% accuracy.")
+        else:
+            print(f"Fastest interval with {target_accuracy:.2f}% accuracy: {fastest:.0f} ms")
+        print(f"Tests run: {runs}")
+        print(f"Execution Time: {time.time() - start_time:.6f} seconds")
+
     while True:
         print("Select an option:")
         print("1. Analyze a previous test")
         print("2. Run a new test")
         print("3. Perform a full analysis sweep")
-        print("4. Exit")
+        print("4. Perform an adaptive interval search")
+        print("5. Tune decoder parameters")
+        print("6. Create a payload file")
+        print("7. Run a stream of frames")
+        print("8. Benchmark the matched filter decoder")
+        print("9. Exit")
         choice = input().strip()
 
         if choice == '1':
@@ -413,6 +882,18 @@ def main():
         elif choice == '3':
             full_analysis_sweep()
         elif choice == '4':
+            adaptive_interval_search()
+        elif choice == '5':
+            sample_rate = int(get_user_input("Enter sample rate (ms)", "10"))
+            tune_all(sample_rate)
+        elif choice == '6':
+            create_payload()
+        elif choice == '7':
+            run_stream()
+        elif choice == '8':
+            sample_rate = int(get_user_input("Enter sample rate (ms)", "10"))
+            benchmark_all(decode_temp_msg, sample_rate)
+        elif choice == '9':
             break
         else:
             print("Invalid choice. Please select again.")
@@ -0,0 +1,331 @@
+import numpy as np
+from PIL import Image
+from typing import List, Optional, Tuple, Union
+from hamming import data_positions, decode_blocks
+from progressive import to_bit_vector
+
+# Segment header fields: segment index (modulo 16), body length, Rice parameter and first pixel
+INDEX_BITS = 4
+LENGTH_BITS = 12
+RICE_BITS = 3
+FIELD_BITS = INDEX_BITS + LENGTH_BITS + RICE_BITS + 1
+MAX_RICE = (1 << RICE_BITS) - 1
+
+# The fields are protected by an extended Hamming (32, 26) code shortened to the positions actually sent,
+# so a single error in a header is corrected and a corrupted length field cannot go unnoticed
+HEADER_BLOCK_SIZE = 32
+HEADER_POSITIONS = np.sort(np.concatenate(([0, 1, 2, 4, 8, 16], data_positions(HEADER_BLOCK_SIZE)[:FIELD_BITS])))
+HEADER_BITS = len(HEADER_POSITIONS)
+
+class PayloadDecode:
+    def __init__(self, pixels: int) -> None:
+        """
+        Initialize the PayloadDecode object.
+
+        Attributes:
+        pixels (np.ndarray): The decoded pixels, -1 where a segment could not be decoded.
+        consumed_bits (int): Number of coded bits read to decode the payload.
+        faulty_segments (List[int]): Indices of the segments that could not be decoded.
+        """
+        self.pixels: np.ndarray = np.full(pixels, -1, dtype=np.int8)
+        self.consumed_bits: int = 0
+        self.faulty_segments: List[int] = []
+
+    @property
+    def compression_ratio(self) -> float:
+        """
+        float: Pixels per coded bit.
+        """
+        return len(self.pixels) / self.consumed_bits if self.consumed_bits else 0.0
+
+def bit_runs(bits: np.ndarray) -> Tuple[int, np.ndarray]:
+    """
+    Split a bit vector into runs of equal bits.
+
+    Parameters:
+    bits (np.ndarray): The bits.
+
+    Returns:
+    Tuple[int, np.ndarray]: The first bit and the length of every run.
+    """
+    changes = np.flatnonzero(np.diff(bits)) + 1
+    bounds = np.concatenate(([0], changes, [len(bits)]))
+    return int(bits[0]), np.diff(bounds)
+
+def rice_cost(values: np.ndarray) -> np.ndarray:
+    """
+    Compute the Golomb-Rice coded size of some values for every Rice parameter.
+
+    Parameters:
+    values (np.ndarray): The non-negative values to code.
+
+    Returns:
+    np.ndarray: The total size in bits for each parameter 0..MAX_RICE.
+    """
+    k = np.arange(MAX_RICE + 1)[:, None]
+    return ((values[None, :] >> k) + 1 + k).sum(axis=1)
+
+def rice_encode(values: np.ndarray, k: int) -> str:
+    """
+    Golomb-Rice encode values: the quotient in unary (ones ended by a zero), then k remainder bits.
+
+    Parameters:
+    values (np.ndarray): The non-negative values to code.
+    k (int): The Rice parameter.
+
+    Returns:
+    str: The coded bits.
+    """
+    codes = []
+    for value in values.tolist():
+        codes.append('1' * (value >> k) + '0')
+        if k:
+            codes.append(format(value & ((1 << k) - 1), f'0{k}b'))
+    return ''.join(codes)
+
+def encode_header(fields: str) -> str:
+    """
+    Protect the fields of a segment header with the shortened extended Hamming code.
+
+    Parameters:
+    fields (str): The FIELD_BITS header fields.
+
+    Returns:
+    str: The HEADER_BITS coded header.
+    """
+    block = np.zeros(HEADER_BLOCK_SIZE, dtype=np.int64)
+    block[data_positions(HEADER_BLOCK_SIZE)[:FIELD_BITS]] = to_bit_vector(fields)
+
+    # Parity bit 2^j covers the positions with bit j set, bit 0 makes the whole block even
+    positions = np.arange(HEADER_BLOCK_SIZE)
+    for j in range(HEADER_BLOCK_SIZE.bit_length() - 1):
+        block[1 << j] = block[(positions >> j) & 1 == 1].sum() % 2
+    block[0] = block[1:].sum() % 2
+    return ''.join(map(str, block[HEADER_POSITIONS]))
+
+def decode_header(header: str, correct: bool = True) -> Optional[str]:
+    """
+    Check and correct a segment header.
+
+    Parameters:
+    header (str): The HEADER_BITS received header.
+    correct (bool, optional): Whether a single error may be corrected, otherwise only error free headers pass. Defaults to True.
+
+    Returns:
+    Optional[str]: The header fields, or None if the header has uncorrectable errors.
+    """
+    block = np.zeros((1, HEADER_BLOCK_SIZE), dtype=np.int64)
+    block[0, HEADER_POSITIONS] = to_bit_vector(header)
+    data, corrected, multiple_errors = decode_blocks(block)
+    if multiple_errors[0] or (corrected[0] and not correct):
+        return None
+
+    # A correction pointing at a position that is never sent means more than one error
+    if np.any(data[0, FIELD_BITS:]):
+        return None
+    return ''.join(map(str, data[0, :FIELD_BITS]))
+
+def encode_segment(bits: np.ndarray, index: int = 0) -> str:
+    """
+    Run-length encode a segment of pixels with the Rice parameter that makes it shortest.
+
+    Parameters:
+    bits (np.ndarray): The pixels of the segment.
+    index (int, optional): The position of the segment in the payload. Defaults to 0.
+
+    Returns:
+    str: The coded segment header followed by the Rice coded run lengths.
+
+    Raises:
+    ValueError: If the coded segment does not fit in the length field.
+    """
+    first, runs = bit_runs(bits)
+    k = int(np.argmin(rice_cost(runs - 1)))
+    body = rice_encode(runs - 1, k)
+    if len(body) >= 1 << LENGTH_BITS:
+        raise ValueError("The segment is too long, use fewer rows per segment.")
+
+    fields = format(index % (1 << INDEX_BITS), f'0{INDEX_BITS}b') + format(len(body), f'0{LENGTH_BITS}b') + format(k, f'0{RICE_BITS}b') + str(first)
+    return encode_header(fields) + body
+
+def compress(bits: Union[str, np.ndarray], width: int, rows_per_segment: int = 8) -> str:
+    """
+    Compress a bitmap into independently decodable segments of run lengths.
+
+    Each segment covers rows_per_segment rows, so a bit error only corrupts the pixels
+    of its own segment.
+
+    Parameters:
+    bits (Union[str, np.ndarray]): The pixels, row by row.
+    width (int): The width of the bitmap.
+    rows_per_segment (int, optional): Rows covered by each segment. Defaults to 8.
+
+    Returns:
+    str: The compressed payload.
+    """
+    bits = to_bit_vector(bits)
+    size = width * rows_per_segment
+    return ''.join(encode_segment(bits[i:i + size], i // size) for i in range(0, len(bits), size))
+
+def decode_segment(body: str, k: int, first: int, pixels: int) -> Optional[np.ndarray]:
+    """
+    Decode the run lengths of a segment.
+
+    Parameters:
+    body (str): The Rice coded run lengths.
+    k (int): The Rice parameter.
+    first (int): The first pixel of the segment.
+    pixels (int): Number of pixels in the segment.
+
+    Returns:
+    Optional[np.ndarray]: The pixels, or None if the body does not decode into exactly that many pixels.
+    """
+    runs = []
+    position = 0
+    decoded = 0
+    while decoded < pixels:
+        end = body.find('0', position)
+        if end == -1 or end + 1 + k > len(body):
+            return None
+        run = ((end - position) << k) + (int(body[end + 1:end + 1 + k], 2) if k else 0) + 1
+        position = end + 1 + k
+        runs.append(run)
+        decoded += run
+
+    if decoded != pixels or position != len(body):
+        return None
+
+    values = (first + np.arange(len(runs))) % 2
+    return np.repeat(values, runs).astype(np.int8)
+
+def read_segment(code: str, position: int, index: int, pixels: int, correct: bool = True) -> Tuple[Optional[int], Optional[np.ndarray]]:
+    """
+    Read a segment at a position of the payload.
+
+    Parameters:
+    code (str): The received payload.
+    position (int): Where the segment header starts.
+    index (int): The segment expected there.
+    pixels (int): Number of pixels in the segment.
+    correct (bool, optional): Whether a single header error may be corrected. Defaults to True.
+
+    Returns:
+    Tuple[Optional[int], Optional[np.ndarray]]: Where the next segment starts (None if the header is corrupted or
+                                                belongs to another segment) and the pixels (None if they do not decode).
+    """
+    header = code[position:position + HEADER_BITS]
+    fields = decode_header(header, correct) if len(header) == HEADER_BITS else None
+    if fields is None or int(fields[:INDEX_BITS], 2) != index % (1 << INDEX_BITS):
+        return None, None
+
+    fields = fields[INDEX_BITS:]
+    length = int(fields[:LENGTH_BITS], 2)
+    k = int(fields[LENGTH_BITS:LENGTH_BITS + RICE_BITS], 2)
+    first = int(fields[LENGTH_BITS + RICE_BITS])
+    end = position + HEADER_BITS + length
+    return end, decode_segment(code[position + HEADER_BITS:end], k, first, pixels)
+
+def find_segment(code: str, start: int, index: int, pixels: int) -> Optional[Tuple[int, np.ndarray]]:
+    """
+    Resynchronize: find the first position where a segment has an error free header with
+    the expected index and decodes into exactly the expected number of pixels.
+
+    Parameters:
+    code (str): The received payload.
+    start (int): The first position to try.
+    index (int): The segment looked for.
+    pixels (int): Number of pixels of the segment.
+
+    Returns:
+    Optional[Tuple[int, np.ndarray]]: Where the next segment starts and the pixels, or None if it is not found.
+    """
+    for position in range(start, len(code) - HEADER_BITS + 1):
+        end, segment = read_segment(code, position, index, pixels, correct=False)
+        if segment is not None:
+            return end, segment
+    return None
+
+def decompress(code: Union[str, np.ndarray], pixels: int, width: int, rows_per_segment: int = 8) -> PayloadDecode:
+    """
+    Decompress a payload produced by compress.
+
+    Segments that do not decode are left as unknown pixels (-1). A single error in a header is
+    corrected. When a segment fails and the next header is not where the failed segment says it
+    ends, the decoder searches the following bits for the next segment and carries on from it,
+    so an error only loses the segments it hits.
+
+    Parameters:
+    code (Union[str, np.ndarray]): The received payload bits.
+    pixels (int): Number of pixels of the bitmap.
+    width (int): The width of the bitmap.
+    rows_per_segment (int, optional): Rows covered by each segment. Defaults to 8.
+
+    Returns:
+    PayloadDecode: The decoded pixels and decoding information.
+    """
+    if not isinstance(code, str):
+        code = ''.join(map(str, to_bit_vector(code)))
+
+    decode = PayloadDecode(pixels)
+    size = width * rows_per_segment
+    segments = -(-pixels // size)
+    position = 0
+    synchronized = True
+
+    for index in range(segments):
+        start = index * size
+        count = min(size, pixels - start)
+
+        if synchronized:
+            end, segment = read_segment(code, position, index, count)
+        else:
+            found = find_segment(code, position, index, count)
+            end, segment = found if found is not None else (None, None)
+
+        if segment is not None:
+            decode.pixels[start:start + count] = segment
+            position = end
+            synchronized = True
+            continue
+
+        decode.faulty_segments.append(index)
+        if synchronized:
+            # The next segment usually starts where this one says it ends, unless its header was corrupted
+            next_count = min(size, pixels - start - size)
+            if end is not None and next_count > 0 and read_segment(code, end, index + 1, next_count)[1] is not None:
+                position = end
+            else:
+                position += HEADER_BITS
+                synchronized = False
+
+    decode.consumed_bits = min(position, len(code))
+    return decode
+
+def image_to_bits(image_path: str, width: int = 32, height: int = 32) -> str:
+    """
+    Convert an image into the 1-bit pixels sent by host.c ('1' white, '0' black).
+
+    Parameters:
+    image_path (str): The image to convert.
+    width (int, optional): The width to resize the image to. Defaults to 32.
+    height (int, optional): The height to resize the image to. Defaults to 32.
+
+    Returns:
+    str: The pixels, row by row.
+    """
+    with Image.open(image_path) as img:
+        bw_image = img.resize((width, height)).convert('1')
+        pixels = np.array(bw_image, dtype=np.uint8).reshape(-1)
+    return ''.join(map(str, pixels))
+
+def write_payload_file(bits: str, path: str) -> None:
+    """
+    Write a payload for host.c, which sends the digits of the file ('0'/'1' or multi-level symbols).
+
+    Parameters:
+    bits (str): The payload bits or symbols.
+    path (str): The file to write.
+    """
+    with open(path, 'w') as file:
+        file.write(bits + '\n')
+    print(f"Payload of {len(bits)} symbols saved as {path}")
@@ -0,0 +1,118 @@
+import os
+import re
+import numpy as np
+from typing import List, Optional
+from utils import TRUTH, HAMMING_TRUTH
+
+# Run files are saved as <iteration>_<hamming>_<accuracy>[_<device>].txt
+RUN_FILE_PATTERN = re.compile(r'^(\d+)_(True|False)_(\d+)(?:_([\w.-]+))?\.txt$')
+
+# Device tag of runs replayed by fake devices, they are copies of other runs and not new captures
+REPLAY_TAG_PREFIX = 'replay-'
+
+class Trace:
+    def __init__(self, path: str, interval: int, iteration: int, hamming: bool, temps: np.ndarray, device: Optional[str] = None) -> None:
+        """
+        Initialize the Trace object.
+
+        Attributes:
+        path (str): The file the temperatures were read from.
+        interval (int): The bit interval in milliseconds used for the capture.
+        iteration (int): The sweep iteration that produced the capture.
+        hamming (bool): Whether the transmitted message was Hamming encoded.
+        temps (np.ndarray): The temperature readings.
+        device (Optional[str]): The id of the device that produced the capture, None for untagged runs.
+        """
+        self.path: str = path
+        self.interval: int = interval
+        self.iteration: int = iteration
+        self.hamming: bool = hamming
+        self.temps: np.ndarray = temps
+        self.device: Optional[str] = device
+
+    @property
+    def truth(self) -> str:
+        """
+        str: The bit string that was transmitted during the capture.
+        """
+        return HAMMING_TRUTH if self.hamming else TRUTH
+
+def truth_vector(truth: str) -> np.ndarray:
+    """
+    Convert a binary string into a vector of bits.
+
+    Parameters:
+    truth (str): The binary string.
+
+    Returns:
+    np.ndarray: An int8 vector with one element per bit.
+    """
+    return np.frombuffer(truth.encode(), dtype=np.uint8).astype(np.int8) - ord('0')
+
+def load_traces(interval: int, runs_dir: str = 'results/runs', hamming: Optional[bool] = None) -> List[Trace]:
+    """
+    Load every saved run of an interval from the results directory, skipping replayed runs.
+
+    Parameters:
+    interval (int): The interval in milliseconds whose runs should be loaded.
+    runs_dir (str, optional): The directory holding one folder per interval. Defaults to 'results/runs'.
+    hamming (Optional[bool], optional): Only load runs with this Hamming setting. Defaults to None (all runs).
+
+    Returns:
+    List[Trace]: The loaded traces sorted by iteration.
+    """
+    directory = os.path.join(runs_dir, str(interval))
+    traces = []
+    if not os.path.isdir(directory):
+        return traces
+
+    for filename in os.listdir(directory):
+        match = RUN_FILE_PATTERN.match(filename)
+        if match is None or (match.group(4) or '').startswith(REPLAY_TAG_PREFIX):
+            continue
+        run_hamming = match.group(2) == 'True'
+        if hamming is not None and run_hamming != hamming:
+            continue
+        path = os.path.join(directory, filename)
+        temps = np.loadtxt(path, dtype=np.float64, ndmin=1)
+        traces.append(Trace(path, interval, int(match.group(1)), run_hamming, temps, match.group(4)))
+
+    traces.sort(key=lambda trace: (trace.iteration, trace.hamming))
+    return traces
+
+def available_intervals(runs_dir: str = 'results/runs') -> List[int]:
+    """
+    List the intervals that have saved runs.
+
+    Parameters:
+    runs_dir (str, optional): The directory holding one folder per interval. Defaults to 'results/runs'.
+
+    Returns:
+    List[int]: The intervals in milliseconds, slowest first.
+    """
+    intervals = [int(name) for name in os.listdir(runs_dir) if name.isdigit()]
+    return sorted(intervals, reverse=True)
+
+def next_iteration(runs_dir: str = 'results/runs') -> int:
+    """
+    Get the first iteration number not used by any saved run, so new runs never overwrite old ones.
+
+    Parameters:
+    runs_dir (str, optional): The directory holding one folder per interval. Defaults to 'results/runs'.
+
+    Returns:
+    int: One more than the highest saved iteration, 0 if there are no runs.
+    """
+    if not os.path.isdir(runs_dir):
+        return 0
+
+    highest = -1
+    for name in os.listdir(runs_dir):
+        directory = os.path.join(runs_dir, name)
+        if not name.isdigit() or not os.path.isdir(directory):
+            continue
+        for filename in os.listdir(directory):
+            match = RUN_FILE_PATTERN.match(filename)
+            if match:
+                highest = max(highest, int(match.group(1)))
+    return highest + 1
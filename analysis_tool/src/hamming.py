@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from utils import is_power_2
 from typing import Optional, Tuple
 
@@ -130,6 +131,50 @@ def correct_error(decode: HammingDecode) -> Tuple[str, int]:
     # Return the corrected message with an error indicator
     return (corrected_message, 1)
 
+def data_positions(block_size: int) -> np.ndarray:
+    """
+    Get the positions of the data bits inside an extended Hamming block.
+
+    Parameters:
+    block_size (int): The size of each block including parity bits.
+
+    Returns:
+    np.ndarray: The indices of the data bits, in message order.
+    """
+    return np.array([i for i in range(1, block_size) if not is_power_2(i)], dtype=np.int64)
+
+def decode_blocks(blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode and correct many extended Hamming blocks at once.
+
+    A block with odd overall parity has a single error at the position given by its
+    syndrome, which is flipped. A block with even parity and a non-zero syndrome has
+    multiple errors and is left as is.
+
+    Parameters:
+    blocks (np.ndarray): The received bits, one block per row (shape (blocks, block_size)).
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray, np.ndarray]: The data bits of each block, a mask of corrected blocks
+                                               and a mask of blocks with multiple errors.
+    """
+    blocks = np.asarray(blocks, dtype=np.int64)
+    block_size = blocks.shape[1]
+    positions = np.arange(block_size)
+    position_bits = (positions[:, None] >> np.arange(int(math.log2(block_size)))) & 1
+
+    syndrome = ((blocks @ position_bits) % 2) @ (1 << np.arange(position_bits.shape[1]))
+    parity = blocks.sum(axis=1) % 2
+
+    corrected = parity == 1
+    multiple_errors = (parity == 0) & (syndrome != 0)
+
+    fixed = blocks.copy()
+    rows = np.flatnonzero(corrected)
+    fixed[rows, syndrome[rows]] ^= 1
+
+    return fixed[:, data_positions(block_size)], corrected, multiple_errors
+
 # Example usage. Uncomment to try
 
 # block0 = "1110100011011111"
@@ -0,0 +1,246 @@
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional, Union
+from corpus import Trace, load_traces, available_intervals, truth_vector
+from tuner import prefix_sums, split_iterations
+
+class TransitionTemplates:
+    def __init__(self, templates: np.ndarray, counts: np.ndarray, offset: int = 0) -> None:
+        """
+        Initialize the average step responses of every bit transition.
+
+        Attributes:
+        templates (np.ndarray): Mean temperature of each window minus the mean of the previous window,
+                                indexed by (previous bit, bit), shape (2, 2, temps_per_bit).
+        counts (np.ndarray): Number of windows averaged into each template, shape (2, 2).
+        offset (int): Sample index where the first bit window starts.
+        energy (np.ndarray): Squared norm of each template, shape (2, 2).
+        area (np.ndarray): Sum of each template, shape (2, 2).
+        """
+        self.templates: np.ndarray = templates
+        self.counts: np.ndarray = counts
+        self.offset: int = offset
+        self.energy: np.ndarray = (templates ** 2).sum(axis=-1)
+        self.area: np.ndarray = templates.sum(axis=-1)
+
+    @property
+    def temps_per_bit(self) -> int:
+        """
+        int: Number of temperature readings per bit.
+        """
+        return self.templates.shape[-1]
+
+def bit_windows(temps: np.ndarray, temps_per_bit: int, offset: int, num_bits: int) -> np.ndarray:
+    """
+    Reshape the complete bit windows of a trace into rows.
+
+    Parameters:
+    temps (np.ndarray): The temperature readings.
+    temps_per_bit (int): Number of temperature readings per bit.
+    offset (int): Sample index where the first bit window starts.
+    num_bits (int): Maximum number of windows.
+
+    Returns:
+    np.ndarray: The windows, shape (K, temps_per_bit) with K <= num_bits.
+    """
+    windows = min(num_bits, max(len(temps) - offset, 0) // temps_per_bit)
+    return temps[offset:offset + windows * temps_per_bit].reshape(windows, temps_per_bit)
+
+def previous_means(means: np.ndarray) -> np.ndarray:
+    """
+    Get the baseline of every window: the mean of the window before it (its own mean for the first one).
+
+    Parameters:
+    means (np.ndarray): The mean temperature of each window.
+
+    Returns:
+    np.ndarray: The baselines.
+    """
+    return np.concatenate((means[:1], means[:-1]))
+
+def learn_templates(traces: List[Trace], temps_per_bit: int, offset: int = 0) -> TransitionTemplates:
+    """
+    Learn the average step response of each transition (previous bit, bit) from labeled traces.
+
+    Every window is taken relative to the mean of the previous window, so the templates do not
+    depend on how hot the CPU already was. Transitions that never appear get a flat template.
+
+    Parameters:
+    traces (List[Trace]): The labeled traces.
+    temps_per_bit (int): Number of temperature readings per bit.
+    offset (int, optional): Sample index where the first bit window starts. Defaults to 0.
+
+    Returns:
+    TransitionTemplates: The learned templates.
+    """
+    totals = np.zeros((2, 2, temps_per_bit), dtype=np.float64)
+    counts = np.zeros((2, 2), dtype=np.int64)
+
+    for trace in traces:
+        truth = truth_vector(trace.truth)
+        windows = bit_windows(trace.temps, temps_per_bit, offset, len(truth))
+        if not len(windows):
+            continue
+        bits = truth[:len(windows)]
+        previous = np.concatenate(([0], bits[:-1]))
+        responses = windows - previous_means(windows.mean(axis=1))[:, None]
+        np.add.at(totals, (previous, bits), responses)
+        np.add.at(counts, (previous, bits), 1)
+
+    templates = totals / np.maximum(counts, 1)[..., None]
+    return TransitionTemplates(templates, counts, offset)
+
+def transition_costs(temps: np.ndarray, templates: TransitionTemplates) -> np.ndarray:
+    """
+    Compute the squared distance between every bit window and every template.
+
+    The correlation of the whole trace with each template is done with one FFT convolution and
+    then sampled at the window starts. The squared norm of the windows is the same for every
+    template, so it is left out.
+
+    Parameters:
+    temps (np.ndarray): The temperature readings.
+    templates (TransitionTemplates): The transition templates.
+
+    Returns:
+    np.ndarray: The cost of each transition (previous bit, bit) at each window, shape (K, 2, 2).
+    """
+    width = templates.temps_per_bit
+    windows = max(len(temps) - templates.offset, 0) // width
+    if windows == 0:
+        return np.empty((0, 2, 2), dtype=np.float64)
+
+    # Linear correlation through the spectra of the trace and the reversed templates
+    size = 1 << int(np.ceil(np.log2(len(temps) + width - 1)))
+    spectrum = np.fft.rfft(temps, size) * np.fft.rfft(templates.templates[..., ::-1], size)
+    correlation = np.fft.irfft(spectrum, size)[..., width - 1:width - 1 + len(temps)]
+    starts = templates.offset + width * np.arange(windows)
+    correlation = np.moveaxis(correlation[..., starts], -1, 0)
+
+    sums = prefix_sums(temps)
+    baselines = previous_means((sums[starts + width] - sums[starts]) / width)
+    matched = correlation - baselines[:, None, None] * templates.area
+    return templates.energy - 2 * matched
+
+def viterbi(costs: np.ndarray, first_state: int = 0) -> np.ndarray:
+    """
+    Find the bit sequence with the lowest total cost, the state being the previous bit.
+
+    Parameters:
+    costs (np.ndarray): The cost of each transition (previous bit, bit) at each window, shape (K, 2, 2).
+    first_state (int, optional): The bit assumed before the first window. Defaults to 0.
+
+    Returns:
+    np.ndarray: The decoded bits, shape (K,).
+    """
+    metric = np.where(np.arange(2) == first_state, 0.0, np.inf)
+    survivors = np.empty((len(costs), 2), dtype=np.int8)
+    for index, cost in enumerate(costs):
+        paths = metric[:, None] + cost
+        survivors[index] = np.argmin(paths, axis=0)
+        metric = paths[survivors[index], np.arange(2)]
+
+    bits = np.empty(len(costs), dtype=np.int8)
+    state = int(np.argmin(metric))
+    for index in range(len(costs) - 1, -1, -1):
+        bits[index] = state
+        state = survivors[index, state]
+    return bits
+
+def decode_matched(temps: Union[List[float], np.ndarray], templates: TransitionTemplates) -> str:
+    """
+    Decode a message from temperature readings with the matched filter detector.
+
+    Parameters:
+    temps (Union[List[float], np.ndarray]): The temperature readings.
+    templates (TransitionTemplates): The transition templates of the interval.
+
+    Returns:
+    str: The decoded binary message.
+    """
+    bits = viterbi(transition_costs(np.asarray(temps, dtype=np.float64), templates))
+    return ''.join(map(str, bits))
+
+def bit_accuracy(msg: str, truth: str) -> float:
+    """
+    Compute the percentage of the truth bits decoded correctly, missing bits count as errors.
+
+    Parameters:
+    msg (str): The decoded message.
+    truth (str): The transmitted message.
+
+    Returns:
+    float: The accuracy (0-100).
+    """
+    correct = sum(a == b for a, b in zip(msg, truth))
+    return correct / len(truth) * 100
+
+def benchmark_interval(interval: int, baseline: Callable[[List[float], int, float], str], sample_rate: int = 10,
+                       runs_dir: str = 'results/runs', validation_fraction: float = 0.25) -> Optional[Dict]:
+    """
+    Compare the matched filter detector with a baseline decoder on the saved runs of an interval.
+
+    The templates are learned on the training iterations and both decoders are scored and timed
+    on the held-out ones.
+
+    Parameters:
+    interval (int): The interval in milliseconds.
+    baseline (Callable[[List[float], int, float], str]): The decoder to compare with, called as decode_temp_msg.
+    sample_rate (int, optional): The nominal sample rate in milliseconds. Defaults to 10.
+    runs_dir (str, optional): The directory holding the saved runs. Defaults to 'results/runs'.
+    validation_fraction (float, optional): Fraction of iterations held out for validation. Defaults to 0.25.
+
+    Returns:
+    Optional[Dict]: The accuracy and decoding time of both decoders, or None if there are no runs or
+                    a single iteration, so nothing can be held out.
+    """
+    traces = load_traces(interval, runs_dir)
+    if not traces:
+        return None
+
+    training, validation = split_iterations(traces, validation_fraction)
+    if not validation:
+        return None
+    temps_per_bit = interval // sample_rate
+    templates = learn_templates(training, temps_per_bit)
+
+    start = time.perf_counter()
+    matched = [decode_matched(trace.temps, templates) for trace in validation]
+    matched_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    baseline_msgs = [baseline(trace.temps.tolist(), temps_per_bit, interval / 10000) for trace in validation]
+    baseline_time = time.perf_counter() - start
+
+    return {
+        'matched_accuracy': float(np.mean([bit_accuracy(msg, trace.truth) for msg, trace in zip(matched, validation)])),
+        'baseline_accuracy': float(np.mean([bit_accuracy(msg, trace.truth) for msg, trace in zip(baseline_msgs, validation)])),
+        'matched_time': matched_time,
+        'baseline_time': baseline_time,
+        'training_runs': len(training),
+        'validation_runs': len(validation),
+    }
+
+def benchmark_all(baseline: Callable[[List[float], int, float], str], sample_rate: int = 10, runs_dir: str = 'results/runs') -> Dict[int, Dict]:
+    """
+    Compare the matched filter detector with a baseline decoder on every interval with saved runs.
+
+    Parameters:
+    baseline (Callable[[List[float], int, float], str]): The decoder to compare with, called as decode_temp_msg.
+    sample_rate (int, optional): The nominal sample rate in milliseconds. Defaults to 10.
+    runs_dir (str, optional): The directory holding the saved runs. Defaults to 'results/runs'.
+
+    Returns:
+    Dict[int, Dict]: The benchmark of each interval.
+    """
+    results = {}
+    for interval in available_intervals(runs_dir):
+        result = benchmark_interval(interval, baseline, sample_rate, runs_dir)
+        if result is None:
+            print(f"{interval} ms: skipped, no held-out iteration")
+            continue
+        results[interval] = result
+        print(f"{interval} ms: matched filter {result['matched_accuracy']:.2f}% in {result['matched_time'] * 1000:.1f} ms | "
+              f"baseline {result['baseline_accuracy']:.2f}% in {result['baseline_time'] * 1000:.1f} ms "
+              f"({result['validation_runs']} held-out runs)")
+    return results
@@ -0,0 +1,217 @@
+import math
+import numpy as np
+from typing import List, Tuple, Union
+from progressive import to_bit_vector
+from tuner import prefix_sums, window_means
+
+def gray_encode(values: np.ndarray) -> np.ndarray:
+    """
+    Map values to their Gray code, so adjacent levels differ in a single bit.
+
+    Parameters:
+    values (np.ndarray): The values.
+
+    Returns:
+    np.ndarray: The Gray coded values.
+    """
+    return values ^ (values >> 1)
+
+def gray_decode(codes: np.ndarray, bits_per_symbol: int) -> np.ndarray:
+    """
+    Map Gray codes back to their values.
+
+    Parameters:
+    codes (np.ndarray): The Gray coded values.
+    bits_per_symbol (int): Number of bits of each value.
+
+    Returns:
+    np.ndarray: The values.
+    """
+    values = codes.copy()
+    for shift in range(1, bits_per_symbol):
+        values ^= codes >> shift
+    return values
+
+def bits_per_symbol(levels: int) -> int:
+    """
+    Get the bits carried by each symbol.
+
+    Parameters:
+    levels (int): The number of symbol levels, a power of 2.
+
+    Returns:
+    int: log2(levels).
+
+    Raises:
+    ValueError: If levels is not a power of 2 greater than 2.
+    """
+    if levels <= 2 or levels & (levels - 1):
+        raise ValueError("The symbol levels must be a power of 2 greater than 2.")
+    return int(math.log2(levels))
+
+def default_preamble(levels: int) -> np.ndarray:
+    """
+    Build the training preamble: a de Bruijn sequence, so every pair of consecutive levels appears once.
+
+    Parameters:
+    levels (int): The number of symbol levels.
+
+    Returns:
+    np.ndarray: The preamble symbols, starting with a 0 that only serves as first reference.
+    """
+    # Order 2 de Bruijn sequence (Lyndon words construction)
+    sequence = []
+    word = [0] * 3
+
+    def build(t: int, p: int) -> None:
+        if t > 2:
+            if 2 % p == 0:
+                sequence.extend(word[1:p + 1])
+        else:
+            word[t] = word[t - p]
+            build(t + 1, p)
+            for level in range(word[t - p] + 1, levels):
+                word[t] = level
+                build(t + 1, t)
+
+    build(1, 1)
+    return np.array([0] + sequence + sequence[:1], dtype=np.int64)
+
+def encode_symbols(bits: Union[str, np.ndarray], levels: int) -> np.ndarray:
+    """
+    Gray code a message into symbols and prepend the training preamble.
+
+    Parameters:
+    bits (Union[str, np.ndarray]): The message bits, zero padded to a whole number of symbols.
+    levels (int): The number of symbol levels.
+
+    Returns:
+    np.ndarray: The symbols to send.
+    """
+    width = bits_per_symbol(levels)
+    bits = to_bit_vector(bits).astype(np.int64)
+    bits = np.concatenate((bits, np.zeros(-len(bits) % width, dtype=np.int64)))
+    values = bits.reshape(-1, width) @ (1 << np.arange(width - 1, -1, -1))
+    return np.concatenate((default_preamble(levels), gray_encode(values)))
+
+def symbols_to_payload(symbols: np.ndarray) -> str:
+    """
+    Write symbols as the digits host.c expects in multi-level mode.
+
+    Parameters:
+    symbols (np.ndarray): The symbols.
+
+    Returns:
+    str: One digit per symbol.
+    """
+    return ''.join(map(str, symbols))
+
+def symbol_features(means: np.ndarray) -> np.ndarray:
+    """
+    Build the features of every window after the first: the step of the mean temperature,
+    the mean of the previous window (the heating depends on how hot the CPU already is) and a bias.
+
+    Parameters:
+    means (np.ndarray): The mean temperature of each window.
+
+    Returns:
+    np.ndarray: The features, shape (len(means) - 1, 3).
+    """
+    steps = np.diff(means)
+    return np.column_stack((steps, means[:-1], np.ones(len(steps))))
+
+class LevelCalibration:
+    def __init__(self, weights: np.ndarray, feedback: float, thresholds: np.ndarray) -> None:
+        """
+        Initialize a calibration of the symbol levels.
+
+        Attributes:
+        weights (np.ndarray): Linear weights mapping window features to a level estimate.
+        feedback (float): Weight of the previous symbol in the level estimate.
+        thresholds (np.ndarray): Level estimate boundaries between consecutive levels.
+        """
+        self.weights: np.ndarray = weights
+        self.feedback: float = feedback
+        self.thresholds: np.ndarray = thresholds
+
+    def classify(self, features: np.ndarray, previous: int) -> np.ndarray:
+        """
+        Classify windows into symbol levels.
+
+        How much a window heats depends on how hot the previous symbol left the CPU, so the
+        level of every window is computed for each possible previous symbol at once and the
+        decisions are then chained from the known previous symbol.
+
+        Parameters:
+        features (np.ndarray): The window features (see symbol_features).
+        previous (int): The symbol sent before the first window.
+
+        Returns:
+        np.ndarray: The level of each window.
+        """
+        levels = len(self.thresholds) + 1
+        estimates = (features @ self.weights)[:, None] + self.feedback * np.arange(levels)[None, :]
+        table = np.digitize(estimates, self.thresholds)
+
+        symbols = np.empty(len(features), dtype=np.int64)
+        for index, row in enumerate(table):
+            previous = symbols[index] = row[previous]
+        return symbols
+
+def calibrate(features: np.ndarray, previous: np.ndarray, symbols: np.ndarray, levels: int) -> LevelCalibration:
+    """
+    Calibrate the levels from the windows of a known training sequence.
+
+    A least squares fit maps the features and previous symbol to the level, then the thresholds
+    are set halfway between the median estimates of consecutive levels.
+
+    Parameters:
+    features (np.ndarray): The features of the training windows.
+    previous (np.ndarray): The symbols sent before each training window.
+    symbols (np.ndarray): The symbols sent in the training windows.
+    levels (int): The number of symbol levels.
+
+    Returns:
+    LevelCalibration: The calibration.
+    """
+    inputs = np.column_stack((features, previous))
+    weights, _, _, _ = np.linalg.lstsq(inputs, symbols.astype(np.float64), rcond=None)
+    estimates = inputs @ weights
+    centers = np.array([np.median(estimates[symbols == level]) if np.any(symbols == level) else level for level in range(levels)])
+    centers = np.maximum.accumulate(centers)
+    return LevelCalibration(weights[:-1], float(weights[-1]), (centers[1:] + centers[:-1]) / 2)
+
+def decode_multilevel(temps: Union[List[float], np.ndarray], temps_per_bit: float, levels: int, offset: int = 0) -> Tuple[str, np.ndarray, LevelCalibration]:
+    """
+    Decode a multi-level message from temperature readings.
+
+    Parameters:
+    temps (Union[List[float], np.ndarray]): The temperature readings.
+    temps_per_bit (float): Number of temperature readings per symbol.
+    levels (int): The number of symbol levels.
+    offset (int, optional): Sample index where the first symbol window starts. Defaults to 0.
+
+    Returns:
+    Tuple[str, np.ndarray, LevelCalibration]: The decoded bits, the decoded symbols (without preamble) and the calibration.
+
+    Raises:
+    ValueError: If the trace is shorter than the preamble.
+    """
+    width = bits_per_symbol(levels)
+    preamble = default_preamble(levels)
+    temps = np.asarray(temps, dtype=np.float64)
+    windows = int((len(temps) - offset) // temps_per_bit)
+    if windows <= len(preamble):
+        raise ValueError("The trace is shorter than the training preamble.")
+
+    means, _ = window_means(prefix_sums(temps), np.array([offset]), np.array([temps_per_bit]), windows)
+    features = symbol_features(means[0, 0])
+
+    # The first preamble symbol has no previous window, the rest train the levels
+    training = len(preamble) - 1
+    calibration = calibrate(features[:training], preamble[:-1], preamble[1:], levels)
+    symbols = calibration.classify(features[training:], int(preamble[-1]))
+
+    values = gray_decode(symbols, width)
+    bits = (values[:, None] >> np.arange(width - 1, -1, -1)) & 1
+    return ''.join(map(str, bits.ravel())), symbols, calibration
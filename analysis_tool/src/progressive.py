@@ -0,0 +1,211 @@
+import math
+import numpy as np
+from PIL import Image
+from typing import List, Optional, Union
+from hamming import decode_blocks
+from tuner import prefix_sums, decode_means
+
+# Gray levels of the reconstructed image
+BLACK = 0
+WHITE = 255
+UNKNOWN = 128       # Not received yet, no previous runs
+PRIOR_BLACK = 64    # Not received yet, previous runs say black
+PRIOR_WHITE = 192   # Not received yet, previous runs say white
+
+def to_bit_vector(bits: Union[str, np.ndarray, List[int]]) -> np.ndarray:
+    """
+    Convert a binary string or sequence of bits into an int8 bit vector.
+
+    Parameters:
+    bits (Union[str, np.ndarray, List[int]]): The bits.
+
+    Returns:
+    np.ndarray: An int8 vector with one element per bit.
+    """
+    if isinstance(bits, str):
+        return np.frombuffer(bits.encode(), dtype=np.uint8).astype(np.int8) - ord('0')
+    return np.asarray(bits, dtype=np.int8)
+
+class IncrementalDecoder:
+    def __init__(self, temps_per_bit: float, tolerance: float, offset: int = 0) -> None:
+        """
+        Initialize a decoder that turns temperatures into bits as they arrive.
+
+        It decodes the same bits as decode_temp_msg (or decode_with_settings for tuned settings),
+        emitting each bit as soon as its window is complete.
+
+        Attributes:
+        temps_per_bit (float): Number of temperature readings per bit, may be fractional.
+        tolerance (float): Changes within this tolerance repeat the previous bit.
+        offset (int): Sample index where the first bit window starts.
+        windows (int): Number of bits decoded so far.
+        """
+        self.temps_per_bit: float = temps_per_bit
+        self.tolerance: float = tolerance
+        self.offset: int = offset
+        self.windows: int = 0
+        self.pending: np.ndarray = np.empty(0, dtype=np.float64)
+        self.start: int = 0
+        self.prev_mean: Optional[float] = None
+        self.prev_bit: int = 0
+
+    def feed(self, temps: Union[List[float], np.ndarray]) -> np.ndarray:
+        """
+        Add temperature readings and decode every bit window they complete.
+
+        Parameters:
+        temps (Union[List[float], np.ndarray]): The new temperature readings.
+
+        Returns:
+        np.ndarray: The newly decoded bits (possibly empty).
+        """
+        self.pending = np.concatenate((self.pending, np.asarray(temps, dtype=np.float64)))
+        total = self.start + len(self.pending)
+        if total <= self.offset:
+            return np.empty(0, dtype=np.int8)
+
+        windows = int((total - self.offset) // self.temps_per_bit)
+        bounds = np.rint(self.offset + self.temps_per_bit * np.arange(self.windows, windows + 1)).astype(np.int64)
+        bounds = bounds[bounds <= total]
+        if len(bounds) < 2:
+            return np.empty(0, dtype=np.int8)
+
+        local = bounds - self.start
+        sums = prefix_sums(self.pending)
+        means = (sums[local[1:]] - sums[local[:-1]]) / (local[1:] - local[:-1])
+
+        tolerance = np.array([self.tolerance])
+        if self.prev_mean is None:
+            bits = decode_means(means, tolerance)[0]
+        else:
+            bits = decode_means(np.concatenate(([self.prev_mean], means)), tolerance, self.prev_bit)[0, 1:]
+
+        self.prev_mean = means[-1]
+        self.prev_bit = int(bits[-1])
+        self.windows += len(bits)
+        self.pending = self.pending[local[-1]:]
+        self.start = int(bounds[-1])
+        return bits
+
+class ProgressiveImage:
+    def __init__(self, width: int, height: int, hamming_block_size: int = 0, previous: Optional[List[Union[str, np.ndarray]]] = None, fuse: bool = False) -> None:
+        """
+        Initialize an image that is reconstructed in place as its bits arrive.
+
+        Pixels not received yet are gray, or dark/light gray when previous runs give a preview
+        of them. With Hamming code each block is corrected as soon as it is complete.
+
+        Attributes:
+        width (int): The width of the image.
+        height (int): The height of the image.
+        hamming_block_size (int): The Hamming block size of the transfer, 0 if it is not Hamming encoded.
+        buffer (np.ndarray): The preallocated gray image, shape (height, width).
+        decoded (int): Number of pixels decoded so far.
+        corrected_blocks (int): Number of Hamming blocks with a corrected error.
+        faulty_blocks (int): Number of Hamming blocks with multiple errors.
+        """
+        self.width: int = width
+        self.height: int = height
+        self.hamming_block_size: int = hamming_block_size
+        self.fuse: bool = fuse
+        pixels = width * height
+
+        capacity = pixels
+        if hamming_block_size:
+            data_bits = hamming_block_size - int(math.log2(hamming_block_size)) - 1
+            capacity = math.ceil(pixels / data_bits) * hamming_block_size
+
+        self.raw: np.ndarray = np.zeros(capacity, dtype=np.int8)
+        self.received: int = 0
+        self.decoded: int = 0
+        self.decoded_blocks: int = 0
+        self.corrected_blocks: int = 0
+        self.faulty_blocks: int = 0
+        self.buffer: np.ndarray = np.full((height, width), UNKNOWN, dtype=np.uint8)
+        self.flat: np.ndarray = self.buffer.reshape(-1)
+
+        # Previous runs: count of white votes per pixel
+        self.prior_runs: int = 0
+        self.prior_ones: np.ndarray = np.zeros(pixels, dtype=np.int64)
+        for run in previous or []:
+            run = to_bit_vector(run)[:pixels]
+            self.prior_ones[:len(run)] += run
+            self.prior_runs += 1
+        if self.prior_runs:
+            self.flat[:] = np.where(2 * self.prior_ones >= self.prior_runs, PRIOR_WHITE, PRIOR_BLACK)
+
+    @property
+    def complete(self) -> bool:
+        """
+        bool: Whether every pixel has been decoded.
+        """
+        return self.decoded >= self.flat.size
+
+    def update(self, bits: Union[str, np.ndarray, List[int]]) -> int:
+        """
+        Add received bits and decode the pixels they complete.
+
+        Parameters:
+        bits (Union[str, np.ndarray, List[int]]): The newly received bits, in transmission order. Bits set to -1
+                                                  are unknown and leave their pixels as they were.
+
+        Returns:
+        int: The number of pixels decoded so far.
+        """
+        bits = to_bit_vector(bits)
+        count = min(len(bits), len(self.raw) - self.received)
+        self.raw[self.received:self.received + count] = bits[:count]
+        self.received += count
+
+        if self.hamming_block_size:
+            done = self.decoded_blocks
+            complete = self.received // self.hamming_block_size
+            if complete == done:
+                return self.decoded
+            blocks = self.raw[done * self.hamming_block_size:complete * self.hamming_block_size]
+            data, corrected, multiple_errors = decode_blocks(blocks.reshape(-1, self.hamming_block_size))
+            self.corrected_blocks += int(corrected.sum())
+            self.faulty_blocks += int(multiple_errors.sum())
+            self.decoded_blocks = complete
+            data = data.ravel()
+        else:
+            data = self.raw[self.decoded:self.received]
+
+        data = data[:self.flat.size - self.decoded]
+        pixels = slice(self.decoded, self.decoded + len(data))
+
+        known = data >= 0
+        values = data
+        if self.fuse and self.prior_runs:
+            # Majority vote with the previous runs, ties keep the current run
+            ones = 2 * (self.prior_ones[pixels] + data)
+            total = self.prior_runs + 1
+            values = np.where(ones == total, data, ones > total)
+
+        self.flat[pixels] = np.where(known, np.where(values, WHITE, BLACK), self.flat[pixels])
+        self.decoded += len(data)
+        return self.decoded
+
+    def image(self) -> Image.Image:
+        """
+        Get the current reconstruction as an image.
+
+        Returns:
+        Image.Image: An 8-bit gray image of the buffer.
+        """
+        return Image.fromarray(self.buffer)
+
+    def save(self, output_path: str) -> Image.Image:
+        """
+        Save the current reconstruction.
+
+        Parameters:
+        output_path (str): The path where the image will be saved.
+
+        Returns:
+        Image.Image: The saved image.
+        """
+        img = self.image()
+        img.save(output_path)
+        print(f"Image saved as {output_path}")
+        return img
@@ -0,0 +1,266 @@
+import binascii
+import numpy as np
+from typing import Dict, List, Tuple, Union
+from progressive import IncrementalDecoder, to_bit_vector
+
+# Frame layout: sync word | payload length (bytes) | sequence number | payload | CRC-16
+SYNC_WORD = '1111100110101'   # Barker 13, low autocorrelation so it is found even after drifting windows
+LENGTH_BITS = 8
+SEQ_BITS = 8
+CRC_BITS = 16
+HEADER_BITS = len(SYNC_WORD) + LENGTH_BITS + SEQ_BITS
+MAX_PAYLOAD_BYTES = (1 << LENGTH_BITS) - 1
+
+# The decoder always reads the first window as 0, so the stream starts with an idle 0
+LEAD_IN = '0'
+
+class Frame:
+    def __init__(self, seq: int, payload: str, start: int, valid: bool) -> None:
+        """
+        Initialize a frame found in a stream.
+
+        Attributes:
+        seq (int): The sequence number of the frame.
+        payload (str): The payload bits.
+        start (int): Bit index of the sync word in the stream.
+        valid (bool): Whether the CRC checks, corrupted frames are kept only to be reported.
+        """
+        self.seq: int = seq
+        self.payload: str = payload
+        self.start: int = start
+        self.valid: bool = valid
+
+    def __repr__(self) -> str:
+        return f"Frame({self.seq}, {len(self.payload)} bits, start={self.start}, valid={self.valid})"
+
+def frame_crc(bits: str) -> int:
+    """
+    Compute the CRC-16/CCITT (polynomial 0x1021, initial value 0xFFFF) of whole bytes of bits.
+
+    Parameters:
+    bits (str): The bits, a multiple of 8.
+
+    Returns:
+    int: The CRC.
+    """
+    data = int(bits, 2).to_bytes(len(bits) // 8, 'big') if bits else b''
+    return binascii.crc_hqx(data, 0xFFFF)
+
+def build_frame(payload: str, seq: int) -> str:
+    """
+    Build a frame around a payload.
+
+    Parameters:
+    payload (str): The payload bits, zero padded to whole bytes.
+    seq (int): The sequence number, wraps around at 256.
+
+    Returns:
+    str: The frame bits.
+
+    Raises:
+    ValueError: If the payload does not fit in the length field.
+    """
+    payload = payload + '0' * (-len(payload) % 8)
+    if len(payload) // 8 > MAX_PAYLOAD_BYTES:
+        raise ValueError(f"The payload is longer than {MAX_PAYLOAD_BYTES} bytes, split it into more frames.")
+
+    body = format(len(payload) // 8, f'0{LENGTH_BITS}b') + format(seq % (1 << SEQ_BITS), f'0{SEQ_BITS}b') + payload
+    return SYNC_WORD + body + format(frame_crc(body), f'0{CRC_BITS}b')
+
+def build_stream(message: str, payload_bits: int = 64, repetitions: int = 1) -> List[str]:
+    """
+    Split a message into consecutive frames.
+
+    Parameters:
+    message (str): The message bits.
+    payload_bits (int, optional): Payload bits per frame, a multiple of 8. Defaults to 64.
+    repetitions (int, optional): Number of times the message is sent. Defaults to 1.
+
+    Returns:
+    List[str]: The frames, in transmission order.
+    """
+    chunks = [message[i:i + payload_bits] for i in range(0, len(message), payload_bits)]
+    return [build_frame(chunk, seq) for seq, chunk in enumerate(chunks * repetitions)]
+
+def write_stream_file(frames: List[str], path: str) -> None:
+    """
+    Write the frames for host.c in stream mode, one frame per line after the lead-in.
+
+    Parameters:
+    frames (List[str]): The frames.
+    path (str): The file to write.
+    """
+    with open(path, 'w') as file:
+        file.write('\n'.join([LEAD_IN] + frames) + '\n')
+    print(f"Stream of {len(frames)} frames ({sum(map(len, frames))} bits) saved as {path}")
+
+def find_sync(bits: np.ndarray, max_errors: int = 1) -> np.ndarray:
+    """
+    Find every position where the sync word starts.
+
+    Parameters:
+    bits (np.ndarray): The received bits.
+    max_errors (int, optional): Bit errors tolerated in the sync word. Defaults to 1.
+
+    Returns:
+    np.ndarray: The start indices, in increasing order.
+    """
+    sync = to_bit_vector(SYNC_WORD)
+    if len(bits) < len(sync):
+        return np.empty(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(bits, len(sync))
+    return np.flatnonzero((windows != sync).sum(axis=1) <= max_errors)
+
+def extract_frames(bits: Union[str, np.ndarray], max_errors: int = 1, base: int = 0, final: bool = False) -> Tuple[List[Frame], int]:
+    """
+    Extract every frame of a received bit stream.
+
+    After a valid frame the search resumes at its end. A frame whose CRC does not check is
+    reported as corrupted and the search resumes right after its sync word, so a corrupted
+    length field cannot hide the frames that follow.
+
+    Parameters:
+    bits (Union[str, np.ndarray]): The received bits.
+    max_errors (int, optional): Bit errors tolerated in the sync word. Defaults to 1.
+    base (int, optional): Stream index of the first bit, added to the frame starts. Defaults to 0.
+    final (bool, optional): Whether the stream is over, so a frame running past its end is a false sync
+                            and the search goes on. Otherwise the search stops there to wait for more bits.
+                            Defaults to False.
+
+    Returns:
+    Tuple[List[Frame], int]: The frames found and the number of leading bits that are done with
+                             (everything before a frame that is still incomplete).
+    """
+    bits = to_bit_vector(bits)
+    text = ''.join(map(str, np.clip(bits, 0, 1)))
+    frames = []
+    consumed = max(len(bits) - len(SYNC_WORD) + 1, 0)
+    position = 0
+
+    for start in find_sync(bits, max_errors).tolist():
+        if start < position:
+            continue
+
+        header_end = start + HEADER_BITS
+        length = int(text[start + len(SYNC_WORD):start + len(SYNC_WORD) + LENGTH_BITS], 2) * 8 if header_end <= len(bits) else 0
+        end = header_end + length + CRC_BITS
+        if end > len(bits):
+            if final:
+                continue
+            consumed = start
+            break
+
+        body = text[start + len(SYNC_WORD):header_end + length]
+        crc = int(text[header_end + length:end], 2)
+        valid = crc == frame_crc(body) and bool(np.all(bits[start:end] >= 0))
+        seq = int(text[header_end - SEQ_BITS:header_end], 2)
+        frames.append(Frame(seq, text[header_end:header_end + length], base + start, valid))
+        position = end if valid else start + 1
+
+    return frames, max(consumed, min(position, len(bits)))
+
+def missing_frames(frames: List[Frame]) -> int:
+    """
+    Count the frames missing between valid frames (lost or corrupted), from the gaps in their sequence numbers.
+
+    Parameters:
+    frames (List[Frame]): The frames, in stream order.
+
+    Returns:
+    int: The number of sequence numbers skipped.
+    """
+    seqs = np.array([frame.seq for frame in frames if frame.valid], dtype=np.int64)
+    if len(seqs) < 2:
+        return 0
+    return int(((np.diff(seqs) - 1) % (1 << SEQ_BITS)).sum())
+
+def stream_summary(frames: List[Frame], elapsed: float, bits: int) -> Dict:
+    """
+    Summarize a stream: frames received, dropped and the sustained goodput.
+
+    Parameters:
+    frames (List[Frame]): The frames found.
+    elapsed (float): Duration of the stream in seconds.
+    bits (int): Number of bits received in that time.
+
+    Returns:
+    Dict: The frame counts, the raw bit rate and the goodput (valid payload bits per second).
+    """
+    valid = [frame for frame in frames if frame.valid]
+    payload_bits = sum(len(frame.payload) for frame in valid)
+    return {
+        'valid_frames': len(valid),
+        'corrupted_frames': len(frames) - len(valid),
+        'missing_frames': missing_frames(frames),
+        'payload_bits': payload_bits,
+        'bit_rate': bits / elapsed if elapsed else 0.0,
+        'goodput': payload_bits / elapsed if elapsed else 0.0,
+    }
+
+class StreamDecoder:
+    def __init__(self, temps_per_bit: float, tolerance: float, offset: int = 0, max_errors: int = 1) -> None:
+        """
+        Initialize a decoder that extracts frames from temperatures as they arrive.
+
+        Only the bits of a frame that is still incomplete are kept between calls, so it can
+        run over arbitrarily long streams.
+
+        Attributes:
+        decoder (IncrementalDecoder): Turns the temperatures into bits.
+        max_errors (int): Bit errors tolerated in the sync word.
+        bits (np.ndarray): Received bits not consumed by a frame yet.
+        base (int): Stream index of the first bit in bits.
+        frames (List[Frame]): Every frame found so far.
+        """
+        self.decoder: IncrementalDecoder = IncrementalDecoder(temps_per_bit, tolerance, offset)
+        self.max_errors: int = max_errors
+        self.bits: np.ndarray = np.empty(0, dtype=np.int8)
+        self.base: int = 0
+        self.frames: List[Frame] = []
+
+    @property
+    def received(self) -> int:
+        """
+        int: Number of bits decoded so far.
+        """
+        return self.decoder.windows
+
+    def feed(self, temps: Union[List[float], np.ndarray]) -> List[Frame]:
+        """
+        Add temperature readings and extract the frames they complete.
+
+        Parameters:
+        temps (Union[List[float], np.ndarray]): The new temperature readings.
+
+        Returns:
+        List[Frame]: The newly completed frames (possibly empty).
+        """
+        new_bits = self.decoder.feed(temps)
+        if not len(new_bits):
+            return []
+
+        self.bits = np.concatenate((self.bits, new_bits))
+        frames, consumed = extract_frames(self.bits, self.max_errors, self.base)
+        self.bits = self.bits[consumed:]
+        self.base += consumed
+        self.frames.extend(frames)
+        return frames
+
+def decode_stream(temps: Union[List[float], np.ndarray], temps_per_bit: float, tolerance: float, offset: int = 0,
+                  max_errors: int = 1) -> Tuple[List[Frame], np.ndarray]:
+    """
+    Decode a whole recorded stream.
+
+    Parameters:
+    temps (Union[List[float], np.ndarray]): The temperature readings.
+    temps_per_bit (float): Number of temperature readings per bit.
+    tolerance (float): Changes within this tolerance repeat the previous bit.
+    offset (int, optional): Sample index where the first bit window starts. Defaults to 0.
+    max_errors (int, optional): Bit errors tolerated in the sync word. Defaults to 1.
+
+    Returns:
+    Tuple[List[Frame], np.ndarray]: The frames found and the decoded bits.
+    """
+    bits = IncrementalDecoder(temps_per_bit, tolerance, offset).feed(temps)
+    frames, _ = extract_frames(bits, max_errors, final=True)
+    return frames, bits
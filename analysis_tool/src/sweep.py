@@ -0,0 +1,446 @@
+import os
+import json
+import time
+import random
+import threading
+import subprocess
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from corpus import REPLAY_TAG_PREFIX, RUN_FILE_PATTERN
+
+RESULTS_DIR = 'results'
+REPLAY_RESULTS_DIR = 'results/replay'
+INVENTORY_PATH = 'analysis_tool/devices.json'
+
+# Intervals (ms) of the full analysis sweep, slowest first
+INTERVAL_LADDER = [5000, 4000, 3000, 2000, 1000, 500, 400, 300, 200, 100]
+
+class Device:
+    def __init__(self, device_id: str, host: Optional[str] = None, results_dir: str = RESULTS_DIR) -> None:
+        """
+        Initialize a RPi4 board reachable through run_on_pi.
+
+        Attributes:
+        device_id (str): Identifier of this board.
+        host (Optional[str]): The ssh destination of the board, None for the address set in run_on_pi.
+        results_dir (str): The directory the runs and metrics of this board are saved to.
+        """
+        self.device_id: str = device_id
+        self.host: Optional[str] = host
+        self.results_dir: str = results_dir
+
+    def environment(self) -> Dict[str, str]:
+        """
+        Get the environment of run_on_pi, which only overrides its address for boards with an explicit host.
+
+        Returns:
+        Dict[str, str]: The environment variables.
+        """
+        if self.host is None:
+            return dict(os.environ)
+        return dict(os.environ, RPI=self.host)
+
+    @property
+    def tag(self) -> str:
+        """
+        str: The tag of the saved runs and metrics of this device.
+        """
+        return self.device_id
+
+    def run(self, milis: int, hamming: bool, sampling: int, measurements: int) -> str:
+        """
+        Runs the covert channel on the board and returns the logged temperatures.
+
+        Parameters:
+        milis (int): The duration in milliseconds of each bit.
+        hamming (bool): Whether to use Hamming encoding.
+        sampling (int): The sampling period in microseconds.
+        measurements (int): The number of temperatures to log.
+
+        Returns:
+        str: The output of the command.
+        """
+        command = "./analysis_tool/shell_scripts/run_on_pi " + str(milis) + " " + str(int(hamming)) + " " + str(measurements) + " " + str(sampling)
+        print(f"[{self.device_id}] {command}")
+
+        env = self.environment()
+        result = subprocess.run(command, shell=True, capture_output=True, text=True, env=env)
+
+        return result.stdout
+
+    def stream(self, milis: int, hamming: bool, sampling: int, measurements: int) -> Iterator[str]:
+        """
+        Runs the covert channel on the board and yields the logged temperatures as they arrive.
+
+        Parameters:
+        milis (int): The duration in milliseconds of each bit.
+        hamming (bool): Whether to use Hamming encoding.
+        sampling (int): The sampling period in microseconds.
+        measurements (int): The number of temperatures to log.
+
+        Returns:
+        Iterator[str]: The output lines of the command.
+        """
+        command = "./analysis_tool/shell_scripts/run_on_pi " + str(milis) + " " + str(int(hamming)) + " " + str(measurements) + " " + str(sampling)
+        print(f"[{self.device_id}] {command}")
+
+        env = self.environment()
+        with subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, text=True, env=env) as process:
+            for line in process.stdout:
+                yield line
+
+class ReplayDevice(Device):
+    def __init__(self, device_id: str, runs_dir: str = 'results/runs', time_scale: float = 0.0, seed: Optional[int] = None,
+                 results_dir: str = REPLAY_RESULTS_DIR) -> None:
+        """
+        Initialize a local fake board that replays saved runs instead of using a RPi4.
+
+        Its results go to a scratch directory and are tagged as replayed, so they are never
+        mistaken for real captures.
+
+        Attributes:
+        device_id (str): Identifier of this device.
+        runs_dir (str): The directory holding one folder of saved runs per interval.
+        time_scale (float): Fraction of the real transfer time to wait before returning, 0 returns immediately.
+        """
+        super().__init__(device_id, host='local', results_dir=results_dir)
+        self.runs_dir: str = runs_dir
+        self.time_scale: float = time_scale
+        self.random = random.Random(device_id if seed is None else seed)
+
+    def run(self, milis: int, hamming: bool, sampling: int, measurements: int) -> str:
+        """
+        Returns a saved run of the same interval and Hamming setting.
+
+        Parameters:
+        milis (int): The duration in milliseconds of each bit.
+        hamming (bool): Whether to use Hamming encoding.
+        sampling (int): The sampling period in microseconds.
+        measurements (int): The number of temperatures to log.
+
+        Returns:
+        str: The temperatures of the replayed run.
+
+        Raises:
+        FileNotFoundError: If there are no saved runs for the interval and Hamming setting.
+        """
+        if self.time_scale > 0:
+            time.sleep(measurements * sampling / 1e6 * self.time_scale)
+
+        return ''.join(self.replay(milis, hamming)[:measurements])
+
+    @property
+    def tag(self) -> str:
+        """
+        str: The tag of the saved runs and metrics of this device, marked as replayed.
+        """
+        return REPLAY_TAG_PREFIX + self.device_id
+
+    def stream(self, milis: int, hamming: bool, sampling: int, measurements: int) -> Iterator[str]:
+        """
+        Yields the temperatures of a saved run one at a time, paced like the real board.
+
+        Parameters:
+        milis (int): The duration in milliseconds of each bit.
+        hamming (bool): Whether to use Hamming encoding.
+        sampling (int): The sampling period in microseconds.
+        measurements (int): The number of temperatures to log.
+
+        Returns:
+        Iterator[str]: The lines of the replayed run.
+        """
+        for line in self.replay(milis, hamming)[:measurements]:
+            if self.time_scale > 0:
+                time.sleep(sampling / 1e6 * self.time_scale)
+            yield line
+
+    def replay(self, milis: int, hamming: bool) -> List[str]:
+        """
+        Pick a saved run of the same interval and Hamming setting, never a replayed one.
+
+        Parameters:
+        milis (int): The duration in milliseconds of each bit.
+        hamming (bool): Whether the run used Hamming encoding.
+
+        Returns:
+        List[str]: The lines of the saved run.
+
+        Raises:
+        FileNotFoundError: If there are no saved runs for the interval and Hamming setting.
+        """
+        directory = os.path.join(self.runs_dir, str(milis))
+        candidates = []
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            match = RUN_FILE_PATTERN.match(name)
+            if match and match.group(2) == str(hamming) and not (match.group(4) or '').startswith(REPLAY_TAG_PREFIX):
+                candidates.append(name)
+        if not candidates:
+            raise FileNotFoundError(f"No saved runs in {directory} with Hamming={hamming}")
+
+        with open(os.path.join(directory, self.random.choice(candidates)), 'r') as file:
+            return file.readlines()
+
+def load_inventory(path: str = INVENTORY_PATH) -> List[Device]:
+    """
+    Load the devices available for sweeps.
+
+    The inventory is a JSON list, each entry has an "id" and either a "host" for a real board
+    (the address set in run_on_pi if it has neither) or a "replay" directory of saved runs for a
+    local fake device (with an optional "time_scale").
+    An optional "results" directory overrides where the runs and metrics of the device are saved.
+
+    Parameters:
+    path (str, optional): The inventory file. Defaults to INVENTORY_PATH.
+
+    Returns:
+    List[Device]: The devices, or a single board at the address set in run_on_pi if the inventory does not exist.
+
+    Raises:
+    ValueError: If the inventory is empty or has duplicated ids.
+    """
+    if not os.path.isfile(path):
+        return [Device('rpi4')]
+
+    with open(path, 'r') as file:
+        entries = json.load(file)
+
+    devices = []
+    for entry in entries:
+        if 'replay' in entry:
+            devices.append(ReplayDevice(entry['id'], entry['replay'], entry.get('time_scale', 0.0),
+                                        results_dir=entry.get('results', REPLAY_RESULTS_DIR)))
+        else:
+            devices.append(Device(entry['id'], entry.get('host'), entry.get('results', RESULTS_DIR)))
+
+    ids = [device.device_id for device in devices]
+    if not ids:
+        raise ValueError(f"The inventory {path} has no devices.")
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"The inventory {path} has duplicated device ids.")
+    return devices
+
+class SweepJob:
+    def __init__(self, interval: int, hamming: bool, iteration: int) -> None:
+        """
+        Initialize a single test of the sweep matrix.
+
+        Attributes:
+        interval (int): The interval in milliseconds.
+        hamming (bool): Whether to use Hamming code.
+        iteration (int): The repetition number of this interval and Hamming setting.
+        """
+        self.interval: int = interval
+        self.hamming: bool = hamming
+        self.iteration: int = iteration
+
+    def __repr__(self) -> str:
+        return f"SweepJob({self.interval}, {self.hamming}, {self.iteration})"
+
+def sweep_matrix(iterations: int, intervals: List[int] = INTERVAL_LADDER, hammings: Tuple[bool, ...] = (False, True)) -> List[SweepJob]:
+    """
+    Build the jobs of a sweep, one per iteration, interval and Hamming setting.
+
+    Parameters:
+    iterations (int): Number of repetitions of each test.
+    intervals (List[int], optional): The intervals in milliseconds. Defaults to INTERVAL_LADDER.
+    hammings (Tuple[bool, ...], optional): The Hamming settings. Defaults to (False, True).
+
+    Returns:
+    List[SweepJob]: The jobs ordered by iteration.
+    """
+    return [SweepJob(interval, hamming, i) for i in range(iterations) for hamming in hammings for interval in intervals]
+
+def run_sweep(jobs: List[SweepJob], devices: List[Device], run_job: Callable[[SweepJob, Device], Any]) -> List[Tuple[SweepJob, str, Any]]:
+    """
+    Run the jobs of a sweep on several devices in parallel.
+
+    Every device runs on its own thread and takes a new job as soon as it is free. Among
+    the pending jobs it picks the first one of the interval it has run the fewest times,
+    so the repetitions of each interval are spread over all the boards and per-board thermal
+    differences don't bias one interval.
+
+    Parameters:
+    jobs (List[SweepJob]): The jobs to run.
+    devices (List[Device]): The devices to run them on.
+    run_job (Callable[[SweepJob, Device], Any]): Runs a job on a device and returns its result.
+
+    Returns:
+    List[Tuple[SweepJob, str, Any]]: The job, device id and result of each job in completion order.
+                                     The result is None if the job failed.
+    """
+    pending = list(jobs)
+    results = []
+    lock = threading.Lock()
+    runs_per_interval: Dict[str, Dict[int, int]] = {device.device_id: {} for device in devices}
+
+    def next_job(device: Device) -> Optional[SweepJob]:
+        with lock:
+            if not pending:
+                return None
+            counts = runs_per_interval[device.device_id]
+            job = min(pending, key=lambda candidate: counts.get(candidate.interval, 0))
+            pending.remove(job)
+            counts[job.interval] = counts.get(job.interval, 0) + 1
+            return job
+
+    def worker(device: Device) -> None:
+        job = next_job(device)
+        while job is not None:
+            try:
+                result = run_job(job, device)
+            except Exception as error:
+                print(f"[{device.device_id}] {job} failed: {error}")
+                result = None
+            with lock:
+                results.append((job, device.device_id, result))
+            job = next_job(device)
+
+    threads = [threading.Thread(target=worker, args=(device,), name=device.device_id) for device in devices]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+# Two-sided 95% Student t quantiles for 1 to 20 degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086]
+
+class IntervalEstimate:
+    def __init__(self, interval: int) -> None:
+        """
+        Initialize the accuracy estimate of an interval.
+
+        Attributes:
+        interval (int): The interval in milliseconds.
+        accuracies (List[float]): The accuracy of every repetition run so far.
+        """
+        self.interval: int = interval
+        self.accuracies: List[float] = []
+
+    @property
+    def mean(self) -> float:
+        """
+        float: The mean accuracy of the repetitions.
+        """
+        return sum(self.accuracies) / len(self.accuracies)
+
+    @property
+    def half_width(self) -> float:
+        """
+        float: Half width of the 95% confidence interval of the mean accuracy.
+        """
+        n = len(self.accuracies)
+        if n < 2:
+            return float('inf')
+        variance = sum((accuracy - self.mean) ** 2 for accuracy in self.accuracies) / (n - 1)
+        t = T_95[n - 2] if n - 2 < len(T_95) else 1.96
+        return t * (variance / n) ** 0.5
+
+def estimate_interval(interval: int, hamming: bool, devices: List[Device], run_job: Callable[[SweepJob, Device], Any],
+                      target_accuracy: float, max_half_width: float, min_repetitions: int, max_repetitions: int,
+                      first_iteration: int = 0) -> IntervalEstimate:
+    """
+    Repeat an interval until its accuracy is known well enough (sequential testing).
+
+    Repetitions run in rounds of one per device. It stops once the confidence interval is
+    narrower than max_half_width, once it lies entirely above or below the target accuracy,
+    or after max_repetitions.
+
+    Parameters:
+    interval (int): The interval in milliseconds.
+    hamming (bool): Whether to use Hamming code.
+    devices (List[Device]): The devices to run on.
+    run_job (Callable[[SweepJob, Device], Any]): Runs a job on a device and returns its accuracy.
+    target_accuracy (float): The accuracy (0-100) the interval is tested against.
+    max_half_width (float): Stop once the 95% confidence interval is this narrow.
+    min_repetitions (int): Repetitions always run before stopping.
+    max_repetitions (int): Repetitions after which the estimate is accepted as is.
+    first_iteration (int, optional): Iteration number of the first repetition, so saved runs are not overwritten. Defaults to 0.
+
+    Returns:
+    IntervalEstimate: The accuracy estimate of the interval.
+    """
+    estimate = IntervalEstimate(interval)
+    iteration = 0
+
+    while iteration < max_repetitions:
+        batch = min(max(len(devices), min_repetitions - iteration), max_repetitions - iteration)
+        jobs = [SweepJob(interval, hamming, first_iteration + iteration + i) for i in range(batch)]
+        iteration += batch
+        estimate.accuracies += [result for _, _, result in run_sweep(jobs, devices, run_job) if result is not None]
+
+        if len(estimate.accuracies) < min_repetitions:
+            continue
+        low = estimate.mean - estimate.half_width
+        high = estimate.mean + estimate.half_width
+        if estimate.half_width <= max_half_width or low >= target_accuracy or high < target_accuracy:
+            break
+
+    print(f"{interval} ms: {estimate.mean if estimate.accuracies else float('nan'):.2f}% "
+          f"± {estimate.half_width:.2f} after {len(estimate.accuracies)} runs")
+    return estimate
+
+def adaptive_sweep(devices: List[Device], run_job: Callable[[SweepJob, Device], Any], hamming: bool = False,
+                   target_accuracy: float = 90.0, intervals: Optional[List[int]] = None, max_half_width: float = 5.0,
+                   min_repetitions: int = 3, max_repetitions: int = 20, first_iteration: int = 0) -> Tuple[Optional[float], Dict[int, IntervalEstimate]]:
+    """
+    Search the fastest interval that meets a target accuracy instead of sweeping every interval.
+
+    Accuracy is assumed to grow with the interval, so the candidates are bisected and only
+    the intervals around the knee of the accuracy curve are repeated. Each visited interval
+    is repeated until its confidence interval is tight enough (see estimate_interval).
+
+    Parameters:
+    devices (List[Device]): The devices to run on.
+    run_job (Callable[[SweepJob, Device], Any]): Runs a job on a device and returns its accuracy.
+    hamming (bool, optional): Whether to use Hamming code. Defaults to False.
+    target_accuracy (float, optional): The accuracy (0-100) to meet. Defaults to 90.
+    intervals (Optional[List[int]], optional): The candidate intervals in milliseconds. Defaults to INTERVAL_LADDER.
+    max_half_width (float, optional): Stop repeating an interval once its 95% confidence interval is this narrow. Defaults to 5.
+    min_repetitions (int, optional): Repetitions always run per visited interval. Defaults to 3.
+    max_repetitions (int, optional): Maximum repetitions per visited interval. Defaults to 20.
+    first_iteration (int, optional): Iteration number of the first repetition of each interval. Defaults to 0.
+
+    Returns:
+    Tuple[Optional[float], Dict[int, IntervalEstimate]]: The estimated fastest interval meeting the target
+                                                         (interpolated between the bracketing intervals, None if
+                                                         even the slowest one misses it) and the visited estimates.
+
+    Raises:
+    RuntimeError: If every run of a visited interval failed, so the search cannot tell whether it meets the target.
+    """
+    candidates = sorted(intervals if intervals else INTERVAL_LADDER)
+    estimates: Dict[int, IntervalEstimate] = {}
+
+    def meets(index: int) -> bool:
+        interval = candidates[index]
+        if interval not in estimates:
+            estimates[interval] = estimate_interval(interval, hamming, devices, run_job, target_accuracy,
+                                                    max_half_width, min_repetitions, max_repetitions, first_iteration)
+        estimate = estimates[interval]
+        if not estimate.accuracies:
+            # A failed interval is not a miss, it would steer the bisection the wrong way
+            raise RuntimeError(f"Every run of {interval} ms failed, the search cannot go on.")
+        return estimate.mean >= target_accuracy
+
+    # Bisect for the first candidate that meets the target
+    if not meets(len(candidates) - 1):
+        return None, estimates
+    low, high = -1, len(candidates) - 1
+    while high - low > 1:
+        middle = (low + high) // 2
+        if meets(middle):
+            high = middle
+        else:
+            low = middle
+
+    fastest = float(candidates[high])
+    if low >= 0:
+        # Interpolate where the accuracy curve crosses the target between the bracketing intervals
+        below, above = estimates[candidates[low]], estimates[candidates[high]]
+        if above.mean > below.mean:
+            fraction = (target_accuracy - below.mean) / (above.mean - below.mean)
+            fastest = below.interval + fraction * (above.interval - below.interval)
+
+    return fastest, estimates
@@ -0,0 +1,256 @@
+import os
+import json
+import math
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from corpus import Trace, load_traces, available_intervals, truth_vector
+
+CONFIG_PATH = 'results/metrics/decoder_config.json'
+
+def prefix_sums(temps: np.ndarray) -> np.ndarray:
+    """
+    Build the cumulative-sum index of a trace so any window mean is O(1).
+
+    Parameters:
+    temps (np.ndarray): The temperature readings.
+
+    Returns:
+    np.ndarray: The cumulative sums, with a leading 0 (length len(temps) + 1).
+    """
+    sums = np.zeros(len(temps) + 1, dtype=np.float64)
+    np.cumsum(temps, out=sums[1:])
+    return sums
+
+def window_means(sums: np.ndarray, offsets: np.ndarray, temps_per_bit: np.ndarray, num_bits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the mean temperature of every bit window for a grid of window starts and widths.
+
+    Parameters:
+    sums (np.ndarray): The cumulative-sum index of the trace (see prefix_sums).
+    offsets (np.ndarray): Candidate sample index where the first window starts, shape (O,).
+    temps_per_bit (np.ndarray): Candidate (possibly fractional) samples per bit, shape (S,).
+    num_bits (int): Number of windows to evaluate.
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray]: The window means and a mask of windows that fit in the trace, both of shape (O, S, num_bits).
+    """
+    samples = len(sums) - 1
+    steps = np.arange(num_bits + 1)
+    bounds = np.rint(offsets[:, None, None] + temps_per_bit[None, :, None] * steps).astype(np.int64)
+    starts = bounds[..., :-1]
+    ends = bounds[..., 1:]
+
+    valid = (ends <= samples) & (ends > starts)
+    starts = np.clip(starts, 0, samples)
+    ends = np.clip(ends, 0, samples)
+    widths = np.maximum(ends - starts, 1)
+    means = (sums[ends] - sums[starts]) / widths
+
+    return means, valid
+
+def decode_means(means: np.ndarray, tolerances: np.ndarray, first: int = 0) -> np.ndarray:
+    """
+    Vectorized equivalent of decode_temp_msg over window means.
+
+    The first window decodes as first (0 by default), a rise above the tolerance as 1, a drop
+    below it as 0 and a change within the tolerance repeats the previous bit.
+
+    Parameters:
+    means (np.ndarray): Window means, shape (..., K).
+    tolerances (np.ndarray): Candidate tolerances, shape (T,).
+    first (int, optional): The bit of the first window. Defaults to 0.
+
+    Returns:
+    np.ndarray: The decoded bits, shape (T, ..., K).
+    """
+    diffs = np.diff(means, axis=-1)
+    tol = tolerances.reshape((-1,) + (1,) * diffs.ndim)
+
+    # 1 = rise, 0 = drop, -1 = keep the previous bit
+    decisions = np.where(diffs > tol, 1, np.where(diffs < -tol, 0, -1)).astype(np.int8)
+    first_column = np.full(decisions.shape[:-1] + (1,), first, dtype=np.int8)
+    decisions = np.concatenate((first_column, decisions), axis=-1)
+
+    # Forward fill the held bits with the index of the last real decision
+    index = np.arange(decisions.shape[-1])
+    last = np.where(decisions >= 0, index, 0)
+    np.maximum.accumulate(last, axis=-1, out=last)
+    return np.take_along_axis(decisions, last, axis=-1)
+
+def grid_accuracy(trace: Trace, offsets: np.ndarray, temps_per_bit: np.ndarray, tolerances: np.ndarray) -> np.ndarray:
+    """
+    Evaluate the bit accuracy of every candidate decoder setting on one trace.
+
+    Parameters:
+    trace (Trace): The recorded trace.
+    offsets (np.ndarray): Candidate window starts, shape (O,).
+    temps_per_bit (np.ndarray): Candidate samples per bit, shape (S,).
+    tolerances (np.ndarray): Candidate tolerances, shape (T,).
+
+    Returns:
+    np.ndarray: The accuracy (0-100) of each setting, shape (T, O, S).
+    """
+    truth = truth_vector(trace.truth)
+    means, valid = window_means(prefix_sums(trace.temps), offsets, temps_per_bit, len(truth))
+    bits = decode_means(means, tolerances)
+    correct = (bits == truth) & valid
+    return correct.sum(axis=-1) / len(truth) * 100
+
+def decode_with_settings(temps: List[float], offset: int, temps_per_bit: float, tolerance: float) -> str:
+    """
+    Decode a message from temperature readings using tuned decoder settings.
+
+    Parameters:
+    temps (List[float]): A list of temperature readings.
+    offset (int): Sample index where the first bit window starts.
+    temps_per_bit (float): Number of temperature readings per bit, may be fractional.
+    tolerance (float): Changes within this tolerance repeat the previous bit.
+
+    Returns:
+    str: The decoded binary message.
+    """
+    temps = np.asarray(temps, dtype=np.float64)
+    num_bits = int((len(temps) - offset) // temps_per_bit)
+    if num_bits <= 0:
+        return ''
+
+    means, valid = window_means(prefix_sums(temps), np.array([offset]), np.array([temps_per_bit]), num_bits)
+    bits = decode_means(means, np.array([tolerance]))[0, 0, 0][valid[0, 0]]
+    return ''.join(map(str, bits))
+
+def split_iterations(traces: List[Trace], validation_fraction: float) -> Tuple[List[Trace], List[Trace]]:
+    """
+    Split traces into training and held-out validation sets by sweep iteration.
+
+    Parameters:
+    traces (List[Trace]): The traces to split.
+    validation_fraction (float): Fraction of the iterations held out for validation.
+
+    Returns:
+    Tuple[List[Trace], List[Trace]]: The training and validation traces.
+    """
+    iterations = sorted({trace.iteration for trace in traces})
+    held_out = math.ceil(len(iterations) * validation_fraction) if len(iterations) > 1 else 0
+    validation_iterations = set(iterations[len(iterations) - held_out:])
+
+    training = [trace for trace in traces if trace.iteration not in validation_iterations]
+    validation = [trace for trace in traces if trace.iteration in validation_iterations]
+    return training, validation
+
+def tune_interval(interval: int, sample_rate: int = 10, runs_dir: str = 'results/runs', validation_fraction: float = 0.25,
+                  offset_steps: int = 25, scale_range: Tuple[float, float] = (0.8, 1.05), scale_steps: int = 26,
+                  tolerance_steps: int = 16) -> Optional[Dict]:
+    """
+    Search the decoder parameters that maximize accuracy over the saved runs of an interval.
+
+    Parameters:
+    interval (int): The interval in milliseconds to tune.
+    sample_rate (int, optional): The nominal sample rate in milliseconds. Defaults to 10.
+    runs_dir (str, optional): The directory holding the saved runs. Defaults to 'results/runs'.
+    validation_fraction (float, optional): Fraction of iterations held out for validation. Defaults to 0.25.
+    offset_steps (int, optional): Number of window starts tried within the first half bit. Defaults to 25.
+    scale_range (Tuple[float, float], optional): Range of samples per bit, relative to the nominal value. Defaults to (0.8, 1.05).
+    scale_steps (int, optional): Number of samples per bit values tried. Defaults to 26.
+    tolerance_steps (int, optional): Number of tolerances tried besides 0. Defaults to 16.
+
+    Returns:
+    Optional[Dict]: The best settings with their training, validation and baseline accuracy, or None if there are no runs.
+                    With a single iteration nothing is held out, so the validation and baseline accuracy are None.
+    """
+    traces = load_traces(interval, runs_dir)
+    if not traces:
+        return None
+
+    nominal_temps_per_bit = interval // sample_rate
+    nominal_tolerance = interval / 10000
+
+    offsets = np.unique(np.linspace(0, nominal_temps_per_bit / 2, offset_steps).astype(np.int64))
+    temps_per_bit = nominal_temps_per_bit * np.linspace(scale_range[0], scale_range[1], scale_steps)
+    tolerances = np.concatenate(([0.0], np.geomspace(nominal_tolerance / 16, nominal_tolerance * 16, tolerance_steps)))
+
+    training, validation = split_iterations(traces, validation_fraction)
+
+    scores = sum(grid_accuracy(trace, offsets, temps_per_bit, tolerances) for trace in training) / len(training)
+    best_t, best_o, best_s = np.unravel_index(np.argmax(scores), scores.shape)
+    best = (np.array([offsets[best_o]]), np.array([temps_per_bit[best_s]]), np.array([tolerances[best_t]]))
+    baseline = (np.array([0]), np.array([float(nominal_temps_per_bit)]), np.array([nominal_tolerance]))
+
+    validation_accuracy = baseline_accuracy = None
+    if validation:
+        validation_accuracy = float(np.mean([grid_accuracy(trace, *best).item() for trace in validation]))
+        baseline_accuracy = float(np.mean([grid_accuracy(trace, *baseline).item() for trace in validation]))
+
+    return {
+        'offset': int(offsets[best_o]),
+        'temps_per_bit': float(temps_per_bit[best_s]),
+        'tolerance': float(tolerances[best_t]),
+        'train_accuracy': float(scores[best_t, best_o, best_s]),
+        'validation_accuracy': validation_accuracy,
+        'baseline_accuracy': baseline_accuracy,
+        'training_runs': len(training),
+        'validation_runs': len(validation),
+    }
+
+def load_decoder_config(interval: int, path: str = CONFIG_PATH) -> Optional[Dict]:
+    """
+    Read the tuned decoder settings of an interval.
+
+    Parameters:
+    interval (int): The interval in milliseconds.
+    path (str, optional): The config file. Defaults to CONFIG_PATH.
+
+    Returns:
+    Optional[Dict]: The tuned settings, or None if the interval has not been tuned.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as file:
+        config = json.load(file)
+    return config.get(str(interval))
+
+def save_decoder_config(settings: Dict[int, Dict], path: str = CONFIG_PATH) -> None:
+    """
+    Write tuned decoder settings back to the config file, keeping other intervals untouched.
+
+    Parameters:
+    settings (Dict[int, Dict]): The tuned settings per interval.
+    path (str, optional): The config file. Defaults to CONFIG_PATH.
+    """
+    config = {}
+    if os.path.isfile(path):
+        with open(path, 'r') as file:
+            config = json.load(file)
+
+    config.update({str(interval): values for interval, values in settings.items()})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(config, file, indent=4, sort_keys=True)
+
+def tune_all(sample_rate: int = 10, runs_dir: str = 'results/runs', path: str = CONFIG_PATH) -> Dict[int, Dict]:
+    """
+    Tune every interval with saved runs and write the best settings to the config file.
+
+    Parameters:
+    sample_rate (int, optional): The nominal sample rate in milliseconds. Defaults to 10.
+    runs_dir (str, optional): The directory holding the saved runs. Defaults to 'results/runs'.
+    path (str, optional): The config file. Defaults to CONFIG_PATH.
+
+    Returns:
+    Dict[int, Dict]: The tuned settings per interval.
+    """
+    settings = {}
+    for interval in available_intervals(runs_dir):
+        tuned = tune_interval(interval, sample_rate, runs_dir)
+        if tuned is None:
+            continue
+        settings[interval] = tuned
+        if tuned['validation_runs']:
+            validation = f"validation {tuned['validation_accuracy']:.2f}% (baseline {tuned['baseline_accuracy']:.2f}%)"
+        else:
+            validation = "validation N/A (a single iteration, nothing held out)"
+        print(f"{interval} ms: offset={tuned['offset']} temps/bit={tuned['temps_per_bit']:.2f} "
+              f"tolerance={tuned['tolerance']:.4f} | train {tuned['train_accuracy']:.2f}% {validation}")
+
+    save_decoder_config(settings, path)
+    print(f"Decoder settings saved to {path}")
+    return settings
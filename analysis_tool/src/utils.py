@@ -1,6 +1,10 @@
 from typing import List
 from PIL import Image
 
+# Messages sent by host.c, used as ground truth by the analysis
+TRUTH = "01101000011011110110110001100001"
+HAMMING_TRUTH = "011001101100001111100111110110111000000101000010"
+
 def is_power_2(x: int) -> bool:
     """
     Check if a number is a power of 2.
@@ -13,6 +13,7 @@
 #define VERBOSE 0
 #define FREQUENCY 1500000
 #define HAMMING_BLOCK_SIZE 16
+#define SHARED_MEM_SIZE 4100
 
 //       ________________________
 //_____/ Hamming encode and utils
@@ -71,12 +72,13 @@ char* hamming_encode(char* bits, int block_size) {
     }
 #endif
 
-    // Allocate memory for the encoded data
-    char* hamming_data = (char*)malloc(final_length * sizeof(char));
+    // Allocate memory for the encoded data and its null terminator
+    char* hamming_data = (char*)malloc((final_length + 1) * sizeof(char));
     if (hamming_data == NULL) {
         printf("Memory allocation failed!\n");
         return NULL;
     }
+    hamming_data[final_length] = '\0';
 
     int data_i = 0;
     for (int block = 0; block < blocks; block++) {
@@ -142,6 +144,103 @@ char* string_to_binary(char* s) {
     return binary;
 }
 
+/**
+ * Reads a payload file, keeping only its digits ('0'/'1' or multi-level symbols).
+ * 
+ * @param path The path of the payload file (e.g. written by the analysis tool compression).
+ * @return The payload bit string. The caller is responsible for freeing the allocated memory.
+ *         Returns NULL if the file can't be read.
+ */
+char* read_payload(const char* path) {
+    FILE *payload_fp = fopen(path, "r");
+    if (payload_fp == NULL) {
+        perror("Error opening payload file");
+        return NULL;
+    }
+
+    size_t size = 0;
+    size_t capacity = 1024;
+    char *payload = malloc(capacity);
+    int ch;
+    while (payload != NULL && (ch = fgetc(payload_fp)) != EOF) {
+        if (ch < '0' || ch > '9') {
+            continue;
+        }
+        if (size + 1 >= capacity) {
+            capacity *= 2;
+            char *grown = realloc(payload, capacity);
+            if (grown == NULL) {
+                free(payload);
+            }
+            payload = grown;
+            if (payload == NULL) {
+                break;
+            }
+        }
+        payload[size++] = (char)ch;
+    }
+    fclose(payload_fp);
+
+    if (payload == NULL) {
+        printf("Memory allocation failed!\n");
+        return NULL;
+    }
+    payload[size] = '\0';
+    return payload;
+}
+
+/**
+ * Sends every line of a frames file as a separate message on the same TA session,
+ * so the session setup and CPU frequency setting are paid once for the whole stream.
+ * 
+ * @param sess The open TA session.
+ * @param op The prepared operation, its second parameter pointing to shared_mem.
+ * @param shared_mem The shared memory each frame is copied to.
+ * @param path The frames file, one frame of '0'/'1' characters per line
+ *             (e.g. written by the analysis tool streaming).
+ * @return The number of frames sent.
+ */
+int send_frames(TEEC_Session *sess, TEEC_Operation *op, TEEC_SharedMemory *shared_mem, const char *path) {
+    FILE *frames_fp = fopen(path, "r");
+    if (frames_fp == NULL) {
+        perror("Error opening frames file");
+        exit(1);
+    }
+
+    TEEC_Result res;
+    uint32_t err_origin;
+    char *line = NULL;
+    size_t line_size = 0;
+    int frames = 0;
+
+    while (getline(&line, &line_size, frames_fp) != -1) {
+        // Keep only the frame bits
+        size_t len = 0;
+        for (char *c = line; *c != '\0'; c++) {
+            if (*c == '0' || *c == '1') {
+                line[len++] = *c;
+            }
+        }
+        line[len] = '\0';
+        if (len == 0) {
+            continue;
+        }
+        if (len >= SHARED_MEM_SIZE) {
+            errx(1, "Frame %d of %zu bits does not fit in the shared memory", frames, len);
+        }
+
+        strcpy(shared_mem->buffer, line);
+        res = TEEC_InvokeCommand(sess, CMD_SEND_WITH_TEMP, op, &err_origin);
+        if (res != TEEC_SUCCESS)
+            errx(1, "TEEC_InvokeCommand failed with code 0x%x origin 0x%x", res, err_origin);
+        frames++;
+    }
+
+    free(line);
+    fclose(frames_fp);
+    return frames;
+}
+
 /**
  * Sets the CPU frequency.
  *
@@ -168,9 +267,9 @@ int main(int argc, char *argv[]){
 	//     __________________________
 	//____/ Arguements setup
 
-	// Check sleep and hamming params
-	if(argc != 3) {
-        printf("Usage: %s <integer> <0/1>\n", argv[0]);
+	// Check sleep and hamming params, the payload file and symbol levels (or stream mode) are optional
+	if(argc < 3 || argc > 5) {
+        printf("Usage: %s <integer> <0/1> [payload_file [levels|stream]]\n", argv[0]);
         return 1;
     }
   	int sleep_milis = atoi(argv[1]);
@@ -185,6 +284,28 @@ int main(int argc, char *argv[]){
         return 1;
     }
 
+	// Stream mode: the payload holds one frame per line
+	int stream = argc == 5 && strcmp(argv[4], "stream") == 0;
+	if (stream && hamming) {
+		printf("Hamming code is not supported in stream mode, frames carry a CRC.\n");
+		return 1;
+	}
+
+	// Multi-level mode: the payload holds symbols from 0 to levels - 1
+	int levels = 0;
+	if (argc == 5 && !stream) {
+		levels = atoi(argv[4]);
+		// One digit per symbol and whole bits per symbol: 2, 4 or 8 levels (see multilevel.py)
+		if (levels < 2 || levels > 8 || (levels & (levels - 1)) != 0) {
+			printf("The symbol levels must be 2, 4 or 8.\n");
+			return 1;
+		}
+		if (hamming && levels > 2) {
+			printf("Hamming code is not supported with multi-level symbols.\n");
+			return 1;
+		}
+	}
+
 	// Set RPI4 freq to max
 	set_cpu_frequency(FREQUENCY);
 #if VERBOSE 
@@ -221,7 +342,7 @@ int main(int argc, char *argv[]){
 	memset(&op, 0, sizeof(op));
 
 	/*
-	 * Prepare the argument. Pass the sleep value (milis) in the first parameter
+	 * Prepare the argument. Pass the sleep value (milis) and symbol levels in the first parameter
 	 * and the second with a shared memory pointer to 64 bytes 
 	 */
 	op.paramTypes = TEEC_PARAM_TYPES(TEEC_VALUE_INPUT, 
@@ -230,10 +351,11 @@ int main(int argc, char *argv[]){
 									 TEEC_NONE);
 
 	op.params[0].value.a = sleep_milis;
+	op.params[0].value.b = levels;
 
-	// Create a shared memory block of 64 bytes
+	// Create a shared memory block of SHARED_MEM_SIZE bytes
 	TEEC_SharedMemory shared_mem;
-	shared_mem.size = 4100;
+	shared_mem.size = SHARED_MEM_SIZE;
 	shared_mem.flags = TEEC_MEM_INPUT;
 	
 	res = TEEC_AllocateSharedMemory(&ctx,&shared_mem);
@@ -276,10 +398,25 @@ int main(int argc, char *argv[]){
                      11111111000111100011111111111111\
                      11111111111111111111111111111111";
 
+		// Send the payload file instead (e.g. a compressed image)
+		if(stream){
+			msg = "";
+		}
+		else if(argc >= 4){
+			msg = read_payload(argv[3]);
+			if (msg == NULL) {
+				errx(1, "Could not read payload %s", argv[3]);
+			}
+		}
+
 		if(hamming){
 			msg = hamming_encode(msg, HAMMING_BLOCK_SIZE);
 		}
 
+		if(strlen(msg) >= SHARED_MEM_SIZE){
+			errx(1, "Payload of %zu bits does not fit in the shared memory", strlen(msg));
+		}
+
     	strcpy(shared_mem.buffer, msg);
 
 	} 
@@ -288,16 +425,23 @@ int main(int argc, char *argv[]){
 	}
 
 	op.params[1].memref.parent = shared_mem.buffer;
-	op.params[1].memref.size   = 4100;
+	op.params[1].memref.size   = SHARED_MEM_SIZE;
 	op.params[1].memref.offset = 0;
 
 	//     _______________________
 	//____/ TA execution calls
 
-	// Call the send_with_temp function on the TA
-	res = TEEC_InvokeCommand(&sess, CMD_SEND_WITH_TEMP, &op, &err_origin);
-	if (res != TEEC_SUCCESS)
-		errx(1, "TEEC_InvokeCommand failed with code 0x%x origin 0x%x", res, err_origin);
+	if (stream) {
+		// Call the send_with_temp function on the TA once per frame
+		int frames = send_frames(&sess, &op, &shared_mem, argv[3]);
+		printf("Sent %d frames\n", frames);
+	}
+	else {
+		// Call the send_with_temp function on the TA
+		res = TEEC_InvokeCommand(&sess, CMD_SEND_WITH_TEMP, &op, &err_origin);
+		if (res != TEEC_SUCCESS)
+			errx(1, "TEEC_InvokeCommand failed with code 0x%x origin 0x%x", res, err_origin);
+	}
 
 	//     ___________________
 	//____/ TA finalization
@@ -95,17 +95,65 @@ long long run_workload(int n){
         return n * run_workload(n - 1) + c;
 }
 
+/**
+ * Runs the workload for a given time.
+ *
+ * @param milis The time in milliseconds to keep the CPU busy.
+ */
+void busy_wait(int milis) {
+	TEE_Time start_time;
+	TEE_Time current_time;
+	TEE_GetSystemTime(&start_time);
+	int elapsed = 0;
+	while (elapsed < milis) {
+		run_workload(1000);
+		TEE_GetSystemTime(&current_time);
+		elapsed = (current_time.seconds - start_time.seconds) * 1000 +
+				  (int)current_time.millis - (int)start_time.millis;
+	}
+}
+
+/**
+ * Executes one symbol of a multi-level message by running the workload with a duty cycle.
+ *
+ * @param symbol The symbol level, from 0 (always sleeping) to levels - 1 (always running the workload).
+ * @param levels The number of symbol levels.
+ * @param bit_time The time in milliseconds of the symbol.
+ */
+void execute_level(int symbol, int levels, int bit_time) {
+	printf("Running workload %d%% of %d miliseconds...\n", 100 * symbol / (levels - 1), bit_time);
+	for (int elapsed = 0; elapsed < bit_time; elapsed += DUTY_SLICE) {
+		// The last slice is shortened so the symbol lasts exactly bit_time
+		int slice = bit_time - elapsed < DUTY_SLICE ? bit_time - elapsed : DUTY_SLICE;
+		int busy = slice * symbol / (levels - 1);
+		if (busy > 0) {
+			busy_wait(busy);
+		}
+		if (busy < slice) {
+			TEE_Wait(slice - busy);
+		}
+	}
+}
+
 /**
  * Parses the input string and executes the workload accordingly.
  *
  * @param str The input string consisting of '1's and '0's.
  *            '1' indicates executing the workload, and '0' indicates sleeping.
+ *            In multi-level mode it consists of digits from '0' to levels - 1 (see execute_level).
  * @param bit_time The time in milliseconds to run the workload or to sleep.
+ * @param levels The number of symbol levels, 0 or 2 for the binary mode.
  */
-void execute_workload(char *str, int bit_time) {
+void execute_workload(char *str, int bit_time, int levels) {
     int len = strlen(str);
     for (int i = 0; i < len; i++) {
-        if (str[i] == '1') {
+        if (levels > 2) {
+            if (str[i] >= '0' && str[i] < '0' + levels) {
+                execute_level(str[i] - '0', levels, bit_time);
+            } else {
+                printf("Invalid character in string: %c\n", str[i]);
+            }
+        } else if (str[i] == '1') {
 			TEE_Time start_time;
 			TEE_Time current_time;
 			TEE_GetREETime(&start_time);
@@ -158,12 +206,14 @@ static TEE_Result send_with_temp(uint32_t param_types, TEE_Param params[4]) {
 	}
 
 	int bit_time = params[0].value.a;
+	int levels = params[0].value.b;
 	char* msg = params[1].memref.buffer;
 	IMSG("Sleep set to: %d", bit_time);
+	IMSG("Symbol levels: %d", levels);
 
 	IMSG("Data from shared memory: %s", params[1].memref.buffer);
 
-    execute_workload(msg,bit_time);
+    execute_workload(msg,bit_time,levels);
 
 	return TEE_SUCCESS;
 }
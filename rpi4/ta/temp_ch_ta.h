@@ -14,5 +14,6 @@
 
 /* Others */
 #define SIZE 5
+#define DUTY_SLICE 100 /* Milliseconds of each workload/sleep cycle in multi-level mode */
 
 #endif /*TEMP_CH_TA_H*/
\ No newline at end of file